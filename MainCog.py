@@ -1,9 +1,11 @@
 
+import asyncio
+import os
 from os import stat
 
 from discord.errors import NotFound
 from game.State import Result
-from typing import Any, Callable, KeysView, Optional, TypeVar
+from typing import Any, Callable, KeysView, Optional, TypeVar, Union
 from discord.embeds import Embed
 from discord.ext import commands
 from discord import Forbidden
@@ -11,8 +13,18 @@ from discord.ext.commands.context import Context
 
 from game.Character import Character
 from game.All import All, LoadException
+from game.Game import Game
+from game.Item import Item
+from game.Session import Session, SessionManager
+from game.Trace import trace
+from Output import OutputScheduler, RateBucket
+from Pages import PageCache, PageList
 #ALL = All("./yamlsources")
 ALL = All("./mysterydungeon", charsDirName="../yamlsources/characters")
+# Only later loads, such as .reload, parse in worker processes. Starting them while this module is being imported would import it again in each of them under spawn
+ALL.workers = os.cpu_count() or 1
+
+CHECKPOINTDIR = "./.hgcheckpoints"
 
 EVENTGREEN = 0xbbff45
 CHARINFOBLUE = 0x2c32db
@@ -20,26 +32,45 @@ MISCORANGE = 0xff9e1f
 ERRORRED = 0xe30f00
 BORDERBLACK = 0x000000
 
+PREVPAGE = "\u25c0\ufe0f"
+NEXTPAGE = "\u25b6\ufe0f"
+# Seconds a list can go without being flipped through before its reactions are removed
+PAGETIMEOUT = 120
+
 class MainCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.charactersSet = [""]
-        self.itemsSet = [""]
-        self.mapSet = "simple"
-        self.eventsSet = [""]
-        self.game = self.getNewGame()
-        
+        # Each channel plays its own game
+        self.sessions = SessionManager(ALL, CHECKPOINTDIR, {"characters": [""], "items": [""], "map": "simple", "events": [""]})
+        # Channel id -> local copy of its rate limit bucket
+        self.rateBuckets: dict[int, RateBucket] = {}
+        # Pages of the .list commands, kept until what they list changes
+        self.pages = PageCache()
+        # Continue the games that were running before the bot restarted
+        for key, e in self.sessions.restoreAll().items():
+            print(f"Couldn't restore the checkpointed game of {key}: {e}")
+    
     ###
     # Utility things
     ###
     
-    def getNewGame(self):
-        return ALL.loadGameWithSettings(
-            self.charactersSet,
-            self.itemsSet,
-            self.mapSet,
-            self.eventsSet
-        )
+    async def getSession(self, ctx: Context) -> Session:
+        """ Gets the Session of the channel the command was sent in, loading a new game for it if it doesn't have one. """
+        session = self.sessions.get(ctx.channel.id)
+        await session.ensureGame()
+        return session
+    
+    async def getGame(self, ctx: Context) -> Game:
+        return (await self.getSession(ctx)).game
+    
+    def getOutput(self, ctx: Context) -> OutputScheduler:
+        """ Gets an OutputScheduler for packing several embeds into each message sent to the channel. """
+        bucket = self.rateBuckets.setdefault(ctx.channel.id, RateBucket())
+        # discord.py 1.x can only send one embed per message, so the embeds are combined into one
+        return OutputScheduler(lambda embeds: ctx.send(embed=embeds[0]), Embed.from_dict, bucket, combine=True)
+    
+    def cog_unload(self):
+        self.sessions.close()
     
     @staticmethod
     def getErrorEmbed(title, description=None):
@@ -78,11 +109,11 @@ class MainCog(commands.Cog):
         return embed
     
     @staticmethod
-    def getResultEmbed(mc: Character, result: Result) -> Embed:
+    def getResultEmbed(mc: Character, result: Result, title: str="Event") -> Embed:
         """ Returns an Embed based on the Result object given by a triggered Event. """
         
         text = "\n\n".join(result.getTexts())
-        embed = MainCog.getCharEmbed(mc, "Event", text, EVENTGREEN)
+        embed = MainCog.getCharEmbed(mc, title, text, EVENTGREEN)
         effects = result.getEffects()
         for char in effects:
             resText = "\n".join(effects[char])
@@ -90,7 +121,7 @@ class MainCog(commands.Cog):
         
         return embed
     
-    async def getSingleCharacter(self, ctx: Context, args: str) -> Optional[Character]:
+    async def getSingleCharacter(self, ctx: Context, game: Game, args: str) -> Optional[Character]:
         """ Attempts to get a loaded Character from the game based on the given args.
             If unsuccessful, sends an error embed to the given Context and returns None,
             otherwise returns the Character. """
@@ -98,7 +129,7 @@ class MainCog(commands.Cog):
         args = await MainCog.checkArgs(ctx, args, ["character name"])
         if not args: return None
         charName, = args
-        char = self.game.getTributeByName(charName)
+        char = game.getTributeByName(charName)
         if not char:
             embed = Embed(
                 title=f"Couldn't find a character named {charName}",
@@ -113,37 +144,56 @@ class MainCog(commands.Cog):
         """ A special Embed creator for Exceptions. """
         return MainCog.getErrorEmbed(title, f"Encountered error:\n\n{e}")
     
-    @staticmethod
-    def wrapAddCall(fun: Callable, callTitle: str, callDesc: str) -> Embed:
-        """ Catches LoadExceptions when trying to add things to ALL. """
+    async def wrapAddCall(self, fun: Callable, callTitle: str, callDesc: str) -> Embed:
+        """ Adds things to ALL away from the event loop, catching LoadExceptions. """
         try:
-            fun()
+            await self.sessions.runWithContent(fun)
         except LoadException as e:
             return MainCog.getExceptionEmbed(callTitle, e)
-            
+        
         return Embed(
             title = callTitle,
             description = callDesc,
             color = MISCORANGE
         )
     
-    @staticmethod
-    def buildListEmbed(title: str, sorteds: tuple[str, Any], valueFun: Callable[[Any], str], inline: bool=True):
-        """ Builds an embed with a list of game objects. Used by the .list commands. """
-        embeds = []
-        for x in range(int(len(sorteds) / 25)+1):
-            n = x * 25
-            embed = Embed(title=title, color=MISCORANGE)
-            for name, obj in sorteds[n:n+25]:
-                embed.add_field(name=name, value=valueFun(obj), inline=inline)
-            embeds.append(embed)
-        
-        return embeds
+    def getPageList(self, ctx: Context, session: Session, name: str, build: Callable[[Game], PageList], version: tuple=()) -> PageList:
+        """ Gets the pages of one of the .list commands for the channel's Game, building them again only if the content or Game changed since last time. """
+        game = session.game
+        return self.pages.get((ctx.channel.id, name), (ALL.version, game) + version, lambda: build(game))
     
-    @staticmethod
-    def buildSingleListEmbed(title: str, sorteds: tuple[str, Any], valueFun: Callable[[Any], str]):
-        embedStr = "\n".join([f"{name}: {valueFun(obj)}" for name, obj in sorteds])
-        return Embed(title=title, description=embedStr, color=MISCORANGE)
+    async def sendPages(self, ctx: Context, getPageList: Callable[[], PageList]):
+        """ Sends the first page of a list as one message, which can be flipped through by reacting to it.
+            The list is gotten again on every flip, so that it's up to date with reloads. """
+        
+        number = 0
+        message = await ctx.send(embed=Embed.from_dict(getPageList().getPage(number)))
+        if getPageList().getPageCount() == 1: return
+        for emoji in (PREVPAGE, NEXTPAGE):
+            await message.add_reaction(emoji)
+        
+        def check(reaction, user) -> bool:
+            return reaction.message.id == message.id and user != self.bot.user and str(reaction.emoji) in (PREVPAGE, NEXTPAGE)
+        
+        while True:
+            try:
+                reaction, user = await self.bot.wait_for("reaction_add", check=check, timeout=PAGETIMEOUT)
+            except asyncio.TimeoutError:
+                break
+            pageList = getPageList()
+            number = (number + (1 if str(reaction.emoji) == NEXTPAGE else -1)) % pageList.getPageCount()
+            try:
+                await message.edit(embed=Embed.from_dict(pageList.getPage(number)))
+                await message.remove_reaction(reaction.emoji, user)
+            except NotFound:
+                return
+            except Forbidden:
+                pass
+        
+        try:
+            await message.clear_reactions()
+        except (Forbidden, NotFound):
+            pass
     
     ############
     # Commands #
@@ -179,7 +229,7 @@ class MainCog(commands.Cog):
         if not args: return
         charName, charGender, charURL = args
         
-        await ctx.send(embed=MainCog.wrapAddCall(
+        await ctx.send(embed=await self.wrapAddCall(
             lambda: ALL.addCharacter(charName, [charGender, charURL]),
             "Add Character",
             f"Added character {charName} with gender {charGender} and image URL {charURL}"
@@ -193,7 +243,7 @@ class MainCog(commands.Cog):
         if not args: return
         itemName, itemTags = args[:2]
         
-        await ctx.send(embed=MainCog.wrapAddCall(
+        await ctx.send(embed=await self.wrapAddCall(
             lambda: ALL.addItem(itemName, itemTags),
             "Add Item",
             f"Added item {itemName} with tags {itemTags}"
@@ -210,31 +260,53 @@ class MainCog(commands.Cog):
         if not args: return
         
         try:
-            self.charactersSet = [a.strip() for a in args[0].split(" ")]
-            self.itemsSet = [a.strip() for a in args[1].split(" ")]
-            self.mapSet = args[2].strip()
-            self.eventsSet = [a.strip() for a in args[3].split(" ")]
-            
-            self.game = self.getNewGame()
+            await self.sessions.get(ctx.channel.id).load(
+                [a.strip() for a in args[0].split(" ")],
+                [a.strip() for a in args[1].split(" ")],
+                args[2].strip(),
+                [a.strip() for a in args[3].split(" ")]
+            )
         except Exception as e:
             await ctx.send(embed=MainCog.getExceptionEmbed("Loading new game", e))
             return
-            
+        
         await ctx.send("Reloaded game.")
     
     @commands.command()
-    async def start(self, ctx: Context):
-        """ Starts the game if it hasn't already been started. """
-        res = self.game.start()
+    async def reload(self, ctx: Context):
+        """ Picks up changes to the game files, then starts a new game in this channel with its current load settings. """
+        try:
+            changes = await self.sessions.runWithContent(ALL.reload)
+            await self.sessions.get(ctx.channel.id).load()
+        except Exception as e:
+            await ctx.send(embed=MainCog.getExceptionEmbed("Reloading game files", e))
+            return
+        
+        embed = Embed(title="Reloaded game files", color=MISCORANGE)
+        for kind, kindChanges in changes.items():
+            lines = [f"{change}: {', '.join(dotsNames)}" for change, dotsNames in kindChanges.items() if dotsNames]
+            if lines:
+                embed.add_field(name=kind.capitalize(), value="\n".join(lines), inline=False)
+        if not embed.fields:
+            embed.description = "No files changed."
+        await ctx.send(embed=embed)
+    
+    @commands.command()
+    async def start(self, ctx: Context, seed: Optional[int]=None):
+        """ Starts the game if it hasn't already been started. Optionally takes a seed, to play the same game as an earlier one. """
+        session = await self.getSession(ctx)
+        res = await session.start(seed)
         if not res:
             await ctx.send(embed=self.getErrorEmbed("Game was already started."))
             return
         else:
-            await ctx.send(embed=Embed(
+            embed = Embed(
                 title="The games are about to begin.",
-                description=self.game.getRoundFlavor(),
+                description=session.game.getRoundFlavor(),
                 color=BORDERBLACK
-            ))
+            )
+            embed.set_footer(text=f"Seed: {session.game.getSeed()}")
+            await ctx.send(embed=embed)
         await ctx.send(embed=Embed(
             title="Round start!",
             description="Use .next to progress a round.",
@@ -249,38 +321,61 @@ class MainCog(commands.Cog):
         except (Forbidden, NotFound):
             pass
         
-        res = self.game.next()
-        if res == None:
-            return self.next()
+        session = await self.getSession(ctx)
+        res, roundGoing = await session.next()
+        # Dead tributes don't get a result, so keep going until someone does
+        while res == None and roundGoing:
+            res, roundGoing = await session.next()
+        return await self.sendResult(ctx, session, res, roundGoing)
+    
+    @commands.command()
+    async def nextall(self, ctx: Context):
+        """ Uses the `next` command until the round is over. """
+        try:
+            await ctx.message.delete()
+        except (Forbidden, NotFound):
+            pass
+        
+        session = await self.getSession(ctx)
+        output = self.getOutput(ctx)
+        try:
+            await session.playRound(lambda res, roundGoing: self.sendResult(ctx, session, res, roundGoing, output))
+        finally:
+            await output.close()
+    
+    async def sendResult(self, ctx: Context, session: Session, res: Union[Result, bool, None], roundGoing: bool, output: OutputScheduler=None) -> bool:
+        """ Sends the result of a turn, and the end of the round if it was the last turn. Returns whether the round is still going.
+            If given an OutputScheduler, the embeds go through it instead of being sent one by one. """
+        async def send(embed: Embed):
+            if output:
+                await output.add(embed.to_dict())
+            else:
+                await ctx.send(embed=embed)
+        
         if res == False:
-            await ctx.send(embed=MainCog.getErrorEmbed("The game hasn't been started. Use .start to start it."))
-            return True
-        await ctx.send(embed=MainCog.getResultEmbed(res.getMainChar(), res))
+            await send(MainCog.getErrorEmbed("The game hasn't been started. Use .start to start it."))
+            return False
+        if res:
+            # Results combined into one embed are told apart by their main Character
+            await send(MainCog.getResultEmbed(res.getMainChar(), res, res.getMainChar().string() if output else "Event"))
         
-        if self.game.isRoundGoing(): return True
+        if roundGoing: return True
         
-        flavor = self.game.getRoundFlavor()
-        await ctx.send(embed=Embed(
+        await send(Embed(
             title="Round end!",
-            description=flavor,
+            description=session.game.getRoundFlavor(),
             color=BORDERBLACK
         ))
+        if output:
+            await output.flush()
         await self.remaining(ctx)
         return False
     
-    @commands.command()
-    async def nextall(self, ctx: Context):
-        """ Uses the `next` command until the round is over. """
-        
-        res = await self.next(ctx)
-        while res:
-            res = await self.next(ctx)
-    
     @commands.command()
     async def remaining(self, ctx: Context):
         """ Gives the number of remaining tributes. """
-        
-
+    
+    
     #
     # Game debugging
     #
@@ -293,11 +388,49 @@ class MainCog(commands.Cog):
         if not args: return
         charName, eventName = args
         
-        result = self.game.triggerByName(charName, eventName)
-        char = self.game.getTributeByName(charName)
+        session = await self.getSession(ctx)
+        # The Game is only read under the Session's lock, since a new one could be loaded in the meantime
+        def triggerLocked() -> tuple[Result, Optional[Character]]:
+            return session.game.triggerByName(charName, eventName), session.game.getTributeByName(charName)
+        result, char = await session.run(triggerLocked)
         
         await ctx.send(embed=MainCog.getResultEmbed(char, result))
     
+    @commands.command()
+    async def trace(self, ctx: Context, *args: str):
+        """ Controls the debug trace. Takes `on` (optionally with a buffer size), `off`, `clear`, or `dump` (optionally with a number of records). """
+        
+        action = args[0].lower() if args else "dump"
+        count = args[1] if len(args) > 1 else None
+        if count != None and not count.isdigit():
+            await ctx.send(embed=MainCog.getErrorEmbed(f"Expected a number, got \"{count}\"."))
+            return
+        
+        if action == "on":
+            trace.enable(int(count) if count else None)
+            await ctx.send(f"Tracing enabled, keeping the last {trace.records.maxlen} records.")
+        elif action == "off":
+            trace.disable()
+            await ctx.send("Tracing disabled.")
+        elif action == "clear":
+            trace.clear()
+            await ctx.send("Cleared the trace.")
+        elif action == "dump":
+            records = trace.dump(int(count) if count else 10)
+            if not records:
+                await ctx.send(embed=MainCog.getErrorEmbed("The trace is empty." if trace.enabled else "Tracing is disabled. Use .trace on to enable it."))
+                return
+            # Embed descriptions are limited to 4096 characters
+            page = ""
+            for record in records:
+                if len(page) + len(record) > 4000:
+                    await ctx.send(embed=Embed(title="Trace", description=f"```{page}```", color=MISCORANGE))
+                    page = ""
+                page += record[:4000] + "\n"
+            await ctx.send(embed=Embed(title="Trace", description=f"```{page}```", color=MISCORANGE))
+        else:
+            await ctx.send(embed=MainCog.getErrorEmbed(f"Unknown trace action \"{action}\". Use on, off, clear, or dump."))
+    
     @commands.command()
     async def give(self, ctx: Context, *args: str):
         """ Adds an Item to a Character's inventory. Takes the name of a loaded Character and the name of a loaded Item. """
@@ -305,30 +438,38 @@ class MainCog(commands.Cog):
         args = await MainCog.checkArgs(ctx, args, ["character name", "item name"])
         if not args: return
         charName, itemName = args
-        tribute = self.game.getTributeByName(charName)
+        session = await self.getSession(ctx)
+        def giveLocked() -> tuple[Optional[Character], Optional[Item]]:
+            tribute = session.game.getTributeByName(charName)
+            item = session.game.getItemByName(itemName)
+            if tribute and item:
+                session.game.giveItem(tribute, item)
+            return tribute, item
+        tribute, item = await session.run(giveLocked)
         if not tribute:
             await ctx.send(f"Couldn't find character named {charName}")
             return
-        item = self.game.getItemByName(itemName)
         if not item:
             await ctx.send(f"Couldn't find item named {itemName}")
             return
-        tribute.copyAndGiveItem(item)
         await ctx.send(f"Gave {item} to {tribute}")
     
     @commands.command()
     async def charinfo(self, ctx: Context, *args: str):
         """ Gets the current state of a Character. Takes the name of a loaded Character. """
         
-        char = await self.getSingleCharacter(ctx, args)
+        session = await self.getSession(ctx)
+        char = await self.getSingleCharacter(ctx, session.game, args)
         if not char: return
         
-        embed = MainCog.getCharEmbed(char, color=CHARINFOBLUE)
-        embed.add_field(name="Location:", value=char.getLocationStr())
-        embed.add_field(name="Items:", value=char.getItemsStr())
-        embed.add_field(name="Tags:", value=char.getTagsStr())
-        embed.add_field(name="Alliance:", value=char.getAllianceStr())
-        embed.add_field(name="Status:", value=char.getAliveStr())
+        # The Character mustn't change while it's being read
+        async with session.lock:
+            embed = MainCog.getCharEmbed(char, color=CHARINFOBLUE)
+            embed.add_field(name="Location:", value=char.getLocationStr())
+            embed.add_field(name="Items:", value=char.getItemsStr())
+            embed.add_field(name="Tags:", value=char.getTagsStr())
+            embed.add_field(name="Alliance:", value=char.getAllianceStr())
+            embed.add_field(name="Status:", value=char.getAliveStr())
         
         url = char.getPicture()
         if url:
@@ -339,43 +480,50 @@ class MainCog(commands.Cog):
     async def listevents(self, ctx: Context):
         """ Lists all Events currently loaded in the game. """
         
-        await ctx.send(embed=MainCog.buildSingleListEmbed(
+        session = await self.getSession(ctx)
+        await self.sendPages(ctx, lambda: self.getPageList(ctx, session, "events", lambda game: PageList(
                 "Loaded Events:",
-                self.game.getSortedEvents(),
-                lambda event: event.getChance()
-        ))
+                game.getSortedEvents(),
+                lambda event: event.getChance(),
+                MISCORANGE,
+                perPage=50,
+                single=True
+        )))
     
     @commands.command(aliases=["loadeditems"])
     async def listitems(self, ctx: Context):
         """ Lists all Items currently loaded in the game. """
         
-        for embed in MainCog.buildListEmbed(
+        session = await self.getSession(ctx)
+        await self.sendPages(ctx, lambda: self.getPageList(ctx, session, "items", lambda game: PageList(
                 "Loaded Items:",
-                self.game.getSortedItems(),
-                lambda item: item.getTagsStr()
-            ):
-            await ctx.send(embed=embed)
+                game.getSortedItems(),
+                lambda item: item.getTagsStr(),
+                MISCORANGE
+        )))
     
     @commands.command(aliases=["loadedzones"])
     async def listzones(self, ctx: Context):
         """ Lists all Zones loaded in the game. """
         
-        for embed in MainCog.buildListEmbed(
+        session = await self.getSession(ctx)
+        await self.sendPages(ctx, lambda: self.getPageList(ctx, session, "zones", lambda game: PageList(
                 "Loaded Zones:",
-                self.game.getSortedZones(),
+                game.getSortedZones(),
                 lambda zone: zone.getConnectionsStr(),
-                False
-            ):
-            await ctx.send(embed=embed)
+                MISCORANGE,
+                inline=False
+        )))
     
     @commands.command(aliases=["loadedchars"])
     async def listchars(self, ctx: Context):
         """ Lists all Characters loaded in the game. """
         
-        for embed in MainCog.buildListEmbed(
+        session = await self.getSession(ctx)
+        # Who's alive changes during the Game, not just when it's loaded
+        await self.sendPages(ctx, lambda: self.getPageList(ctx, session, "chars", lambda game: PageList(
                 "Loaded Characters:",
-                self.game.getSortedTributes(),
-                lambda char: char.getAliveStr()
-            ):
-            await ctx.send(embed=embed)
-    
\ No newline at end of file
+                game.getSortedTributes(),
+                lambda char: char.getAliveStr(),
+                MISCORANGE
+        ), (session.game.population, session.game.population.lifeChanges)))
@@ -0,0 +1,267 @@
+from __future__ import annotations
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Optional
+
+# Discord's limits on embeds
+MAXEMBEDS = 10
+MAXTOTAL = 6000
+MAXTITLE = 256
+MAXDESCRIPTION = 4096
+MAXFIELDS = 25
+MAXFIELDNAME = 256
+MAXFIELDVALUE = 1024
+MAXFOOTER = 2048
+MAXAUTHOR = 256
+# Discord doesn't allow empty field names or values, so this zero-width space stands in for them
+BLANK = "\u200b"
+
+def shorten(text: Optional[str], limit: int) -> Optional[str]:
+    if text == None or len(text) <= limit: return text
+    return text[:limit-1] + "…"
+
+def getEmbedLength(spec: dict[str, Any]) -> int:
+    """ Gets the number of characters of an embed that count towards the total a message can have. """
+    length = len(spec.get("title") or "") + len(spec.get("description") or "")
+    length += len(spec.get("footer", {}).get("text") or "") + len(spec.get("author", {}).get("name") or "")
+    for field in spec.get("fields", []):
+        length += len(field.get("name") or "") + len(field.get("value") or "")
+    return length
+
+def fitEmbed(spec: dict[str, Any]) -> dict[str, Any]:
+    """ Gets a copy of an embed, in Discord's dict form, shortened to fit in Discord's limits.
+        Anything too long is cut off, then if the whole embed is still too long the last fields are dropped and the description is cut down. """
+    
+    spec = dict(spec)
+    if "title" in spec:
+        spec["title"] = shorten(spec["title"], MAXTITLE)
+    if "description" in spec:
+        spec["description"] = shorten(spec["description"], MAXDESCRIPTION)
+    if "footer" in spec:
+        spec["footer"] = dict(spec["footer"], text=shorten(spec["footer"].get("text"), MAXFOOTER))
+    if "author" in spec:
+        spec["author"] = dict(spec["author"], name=shorten(spec["author"].get("name"), MAXAUTHOR))
+    if "fields" in spec:
+        spec["fields"] = [
+            dict(field, name=shorten(field.get("name"), MAXFIELDNAME), value=shorten(field.get("value"), MAXFIELDVALUE))
+            for field in spec["fields"][:MAXFIELDS]
+        ]
+    
+    while getEmbedLength(spec) > MAXTOTAL and spec.get("fields"):
+        spec["fields"] = spec["fields"][:-1]
+    over = getEmbedLength(spec) - MAXTOTAL
+    if over > 0 and spec.get("description"):
+        spec["description"] = shorten(spec["description"], max(len(spec["description"]) - over, 1))
+    return spec
+
+def splitText(text: str, limit: int) -> list[str]:
+    """ Splits text into pieces of at most `limit` characters, breaking at the last line break or space before the limit where there is one. """
+    pieces = []
+    while len(text) > limit:
+        cut = max(text.rfind("\n", 0, limit + 1), text.rfind(" ", 0, limit + 1))
+        if cut <= 0:
+            cut = limit
+        pieces.append(text[:cut])
+        text = text[cut:].lstrip("\n ")
+    if text:
+        pieces.append(text)
+    return pieces
+
+def toFields(spec: dict[str, Any]) -> list[dict[str, Any]]:
+    """ Turns an embed into fields, so that several embeds can be combined into one where a message can only have one.
+        The first field is named by the embed's title and holds its description, split over more fields if it's too long for one, followed by the embed's own fields. """
+    
+    name = shorten(spec.get("title") or spec.get("author", {}).get("name") or BLANK, MAXFIELDNAME)
+    fields = []
+    for piece in splitText(spec.get("description") or "", MAXFIELDVALUE) or [BLANK]:
+        fields.append({"name": name, "value": piece, "inline": False})
+        # Only the first piece is named, so the rest read as a continuation of it
+        name = BLANK
+    fields.extend(spec.get("fields", []))
+    return fields[:MAXFIELDS]
+
+def combineEmbeds(specs: list[dict[str, Any]]) -> dict[str, Any]:
+    """ Combines embeds into one, as fields of it, in the color of the first. """
+    combined: dict[str, Any] = {"type": "rich", "fields": [field for spec in specs for field in toFields(spec)]}
+    if specs and "color" in specs[0]:
+        combined["color"] = specs[0]["color"]
+    return combined
+
+class RateBucket:
+    """ A local copy of a Discord rate limit bucket, allowing at most `limit` sends every `per` seconds.
+        Waiting for it before sending keeps sends from being answered with 429s in the first place. """
+    
+    def __init__(self, limit: int=5, per: float=5.0):
+        self.limit = limit
+        self.per = per
+        # Loop times of the sends within the last `per` seconds
+        self.sent: deque[float] = deque()
+        # Loop time until which nothing can be sent, after a 429
+        self.heldUntil = 0.0
+    
+    def getWait(self, now: float) -> float:
+        """ Gets how long to wait before the next send is allowed. """
+        while self.sent and self.sent[0] <= now - self.per:
+            self.sent.popleft()
+        wait = self.heldUntil - now
+        if len(self.sent) >= self.limit:
+            wait = max(wait, self.sent[0] + self.per - now)
+        return max(wait, 0.0)
+    
+    async def acquire(self):
+        """ Waits until a send is allowed, then counts one. """
+        loop = asyncio.get_running_loop()
+        wait = self.getWait(loop.time())
+        while wait > 0:
+            await asyncio.sleep(wait)
+            wait = self.getWait(loop.time())
+        self.sent.append(loop.time())
+    
+    def hold(self, seconds: float):
+        """ Stops sending for a while, such as after being told to retry later. """
+        self.heldUntil = max(self.heldUntil, asyncio.get_running_loop().time() + seconds)
+
+class OutputScheduler:
+    """ Packs embeds into as few messages as Discord allows, instead of sending each on its own.
+        Embeds are given in Discord's dict form, and turned into whatever `send` takes by `makeEmbed` (such as discord's Embed.from_dict) when they're sent.
+        Up to ten embeds are sent in each message, or if `combine` is set, as many as fit in one embed as its fields, for discord.py versions which can only send one.
+        
+        A message is sent once it can't fit another embed, or `maxDelay` seconds after its first embed was added, whichever comes first.
+        Sends wait for the rate limit bucket, and are retried when answered with a 429. """
+    
+    def __init__(self, send: Callable[[list[Any]], Awaitable], makeEmbed: Callable[[dict[str, Any]], Any]=None, bucket: RateBucket=None, maxDelay: float=1.0, maxRetries: int=5, combine: bool=False):
+        self.send = send
+        self.makeEmbed = makeEmbed if makeEmbed else lambda spec: spec
+        self.bucket = bucket if bucket else RateBucket()
+        self.maxDelay = maxDelay
+        self.maxRetries = maxRetries
+        self.combine = combine
+        self.pending: list[dict[str, Any]] = []
+        # How many embeds, or fields if combining, and characters the pending embeds take up in the message
+        self.pendingSize = 0
+        self.pendingLength = 0
+        self.lock = asyncio.Lock()
+        self.timer: Optional[asyncio.Task] = None
+        # An error from a send made by the timer, raised by the next call instead
+        self.error: Optional[Exception] = None
+        self.messages = 0
+    
+    def raiseError(self):
+        if self.error:
+            error, self.error = self.error, None
+            raise error
+    
+    async def add(self, spec: dict[str, Any]):
+        """ Adds an embed to the next message, sending the pending ones first if it wouldn't fit with them. """
+        self.raiseError()
+        spec = fitEmbed(spec)
+        if self.combine:
+            fields = toFields(spec)
+            size, limit, length = len(fields), MAXFIELDS, getEmbedLength({"fields": fields})
+        else:
+            size, limit, length = 1, MAXEMBEDS, getEmbedLength(spec)
+        if self.pending and (self.pendingSize + size > limit or self.pendingLength + length > MAXTOTAL):
+            await self.flush()
+        
+        self.pending.append(spec)
+        self.pendingSize += size
+        self.pendingLength += length
+        if self.pendingSize >= limit:
+            await self.flush()
+        elif self.timer == None:
+            self.timer = asyncio.create_task(self.flushLater())
+    
+    async def flushLater(self):
+        await asyncio.sleep(self.maxDelay)
+        # Cleared before flushing, so that flush only ever cancels a timer that's still sleeping
+        self.timer = None
+        try:
+            await self.flush()
+        except Exception as e:
+            self.error = e
+    
+    async def flush(self):
+        """ Sends the pending embeds now. """
+        if self.timer:
+            self.timer.cancel()
+            self.timer = None
+        async with self.lock:
+            if not self.pending: return
+            specs, self.pending, self.pendingSize, self.pendingLength = self.pending, [], 0, 0
+            await self.sendNow(specs)
+    
+    async def close(self):
+        """ Sends anything still pending. """
+        await self.flush()
+        self.raiseError()
+    
+    async def sendNow(self, specs: list[dict[str, Any]]):
+        if self.combine:
+            specs = [combineEmbeds(specs)]
+        embeds = [self.makeEmbed(spec) for spec in specs]
+        for attempt in range(self.maxRetries + 1):
+            await self.bucket.acquire()
+            try:
+                await self.send(embeds)
+                self.messages += 1
+                return
+            except Exception as e:
+                # discord's errors have the HTTP status, and a retry_after if they're for a rate limit
+                if getattr(e, "status", None) != 429 or attempt == self.maxRetries: raise
+                self.bucket.hold(getattr(e, "retry_after", None) or self.bucket.per)
+
+class FakeHTTPException(Exception):
+    def __init__(self, status: int, message: str, retryAfter: float=None):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+        self.retry_after = retryAfter
+
+class FakeChannel:
+    """ Stands in for a Discord channel when testing output.
+        Records what's sent, rejects messages over Discord's limits with a 400, and answers sends over its own rate limit with a 429, like Discord would. """
+    
+    def __init__(self, limit: int=5, per: float=5.0, retryAfter: float=None):
+        self.limit = limit
+        self.per = per
+        self.retryAfter = retryAfter if retryAfter != None else per
+        # (loop time, content, embeds) of each accepted send
+        self.sends: list[tuple[float, Optional[str], list[Any]]] = []
+        self.rejected = 0
+        self.forced = 0
+        self.windowStart = None
+        self.windowCount = 0
+    
+    def failNext(self, count: int=1):
+        """ Answers the next sends with a 429 regardless of the rate limit. """
+        self.forced += count
+    
+    def getEmbeds(self) -> list[Any]:
+        return [embed for _, _, embeds in self.sends for embed in embeds]
+    
+    async def send(self, content: str=None, *, embed: Any=None, embeds: list[Any]=None):
+        now = asyncio.get_running_loop().time()
+        if self.windowStart == None or now >= self.windowStart + self.per:
+            self.windowStart = now
+            self.windowCount = 0
+        
+        if self.forced:
+            self.forced -= 1
+            self.rejected += 1
+            raise FakeHTTPException(429, "You are being rate limited.", self.retryAfter)
+        if self.windowCount >= self.limit:
+            self.rejected += 1
+            raise FakeHTTPException(429, "You are being rate limited.", self.windowStart + self.per - now)
+        
+        embeds = ([embed] if embed != None else []) + (embeds or [])
+        if len(embeds) > MAXEMBEDS:
+            raise FakeHTTPException(400, f"Too many embeds ({len(embeds)})")
+        if sum(getEmbedLength(embed) for embed in embeds) > MAXTOTAL:
+            raise FakeHTTPException(400, "Embeds are too long")
+        for embed in embeds:
+            if fitEmbed(embed) != embed:
+                raise FakeHTTPException(400, "An embed is over a limit")
+            if any(not field.get("name") or not field.get("value") for field in embed.get("fields", [])):
+                raise FakeHTTPException(400, "A field is empty")
+        
+        self.windowCount += 1
+        self.sends.append((now, content, embeds))
@@ -0,0 +1,70 @@
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Sequence
+
+from Output import MAXDESCRIPTION, fitEmbed, shorten
+
+class PageList:
+    """ A sorted list of game objects, split into pages which are only rendered when first asked for.
+        Pages are embeds in Discord's dict form. They either have a field per object, or a line per object in the description if `single`. """
+    
+    def __init__(self, title: str, sorteds: Sequence[tuple[str, Any]], valueFun: Callable[[Any], str], color: int, perPage: int=25, inline: bool=True, single: bool=False):
+        self.title = title
+        self.sorteds = sorteds
+        self.valueFun = valueFun
+        self.color = color
+        self.perPage = perPage
+        self.inline = inline
+        self.single = single
+        # Page number -> rendered page
+        self.pages: dict[int, dict[str, Any]] = {}
+    
+    def getPageCount(self) -> int:
+        return max((len(self.sorteds) + self.perPage - 1) // self.perPage, 1)
+    
+    def getPage(self, number: int) -> dict[str, Any]:
+        """ Gets a page, rendering it if it hasn't been yet. Page numbers wrap around. """
+        number %= self.getPageCount()
+        if number in self.pages: return self.pages[number]
+        
+        start = number * self.perPage
+        spec = {"title": self.title, "color": self.color, "type": "rich"}
+        if self.single:
+            lines = [f"{name}: {self.valueFun(obj)}" for name, obj in self.sorteds[start:start+self.perPage]]
+            spec["description"] = shorten("\n".join(lines), MAXDESCRIPTION)
+        else:
+            spec["fields"] = [
+                {"name": name, "value": str(self.valueFun(obj)), "inline": self.inline}
+                for name, obj in self.sorteds[start:start+self.perPage]
+            ]
+        if self.getPageCount() > 1:
+            spec["footer"] = {"text": f"Page {number+1}/{self.getPageCount()}"}
+        
+        page = fitEmbed(spec)
+        self.pages[number] = page
+        return page
+
+class PageCache:
+    """ Keeps the PageLists that have been shown, each with the version of what it was built from.
+        A PageList is only built again once its version changes, such as after content is reloaded or added, or a new Game is loaded.
+        The least recently used ones are dropped once there are more than `maxSize`. """
+    
+    def __init__(self, maxSize: int=64):
+        self.maxSize = maxSize
+        self.lists: OrderedDict[Hashable, tuple[Hashable, PageList]] = OrderedDict()
+    
+    def get(self, key: Hashable, version: Hashable, build: Callable[[], PageList]) -> PageList:
+        cached = self.lists.get(key)
+        if cached and cached[0] == version:
+            self.lists.move_to_end(key)
+            return cached[1]
+        
+        pageList = build()
+        self.lists[key] = (version, pageList)
+        self.lists.move_to_end(key)
+        while len(self.lists) > self.maxSize:
+            self.lists.popitem(last=False)
+        return pageList
+    
+    def clear(self):
+        self.lists.clear()
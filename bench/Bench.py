@@ -0,0 +1,143 @@
+from __future__ import annotations
+import gc
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Optional
+
+class BenchResult:
+    """ The timings of one benchmark, in seconds per operation, with the peak memory allocated by one sample of it. """
+    
+    def __init__(self, name: str, params: dict[str, Any]=None):
+        self.name = name
+        self.params = params if params else {}
+        self.times: list[float] = []
+        self.ops = 0
+        self.peakMemory: Optional[int] = None
+        self.error: Optional[str] = None
+    
+    def getPercentile(self, percent: float) -> float:
+        """ Gets a percentile of the per-operation times, interpolating between the nearest samples. """
+        if not self.times: return 0.0
+        times = sorted(self.times)
+        pos = (len(times) - 1) * percent / 100
+        low = int(pos)
+        high = min(low + 1, len(times) - 1)
+        return times[low] + (times[high] - times[low]) * (pos - low)
+    
+    def getOpsPerSec(self) -> float:
+        total = sum(self.times)
+        if not total: return 0.0
+        return len(self.times) / total
+    
+    def toDict(self) -> dict[str, Any]:
+        if self.error:
+            return {"params": self.params, "error": self.error}
+        return {
+            "params": self.params,
+            "ops": self.ops,
+            "samples": len(self.times),
+            "opsPerSec": self.getOpsPerSec(),
+            "meanUs": sum(self.times) / len(self.times) * 1e6,
+            "p50Us": self.getPercentile(50) * 1e6,
+            "p90Us": self.getPercentile(90) * 1e6,
+            "p99Us": self.getPercentile(99) * 1e6,
+            "minUs": min(self.times) * 1e6,
+            "peakMemoryBytes": self.peakMemory
+        }
+
+def measure(name: str, op: Callable[[Any], Any], setup: Callable[[], Any]=None, number: int=1, repeat: int=20, opsPerCall: int=1, warmup: bool=True, params: dict[str, Any]=None) -> BenchResult:
+    """ Times `op` in `repeat` samples of `number` calls each, giving it what `setup` returned for the sample.
+        If each call does several operations, such as preparing every candidate Event, `opsPerCall` says how many so the times are per operation.
+        Setting up isn't timed. The garbage collector is kept off while timing, as timeit does.
+        One more sample is run with tracemalloc on to find the peak memory it allocates, separately so it doesn't slow the timed ones. """
+    
+    result = BenchResult(name, params)
+    try:
+        if warmup:
+            # Warms up caches, like the inflections and the memoized packs, before anything is measured
+            op(setup() if setup else None)
+        
+        for _ in range(repeat):
+            arg = setup() if setup else None
+            gc.collect()
+            gc.disable()
+            try:
+                start = time.perf_counter()
+                for _ in range(number):
+                    op(arg)
+                elapsed = time.perf_counter() - start
+            finally:
+                gc.enable()
+            result.times.append(elapsed / number / max(opsPerCall, 1))
+            result.ops += number * opsPerCall
+        
+        arg = setup() if setup else None
+        gc.collect()
+        tracemalloc.start()
+        try:
+            for _ in range(number):
+                op(arg)
+            result.peakMemory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    except Exception as e:
+        result.error = f"{type(e).__name__}: {e}"
+    return result
+
+def getMeta() -> dict[str, Any]:
+    """ Describes where the benchmarks were run, so runs on different machines or commits can be told apart. """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+        "commit": commit
+    }
+
+def writeResults(path: Optional[str], results: list[BenchResult]) -> dict[str, Any]:
+    """ Writes the results as JSON to the path, or to stdout if there isn't one. """
+    data = {"meta": getMeta(), "results": {result.name: result.toDict() for result in results}}
+    text = json.dumps(data, indent=2)
+    if path:
+        with open(path, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return data
+
+def compare(baseline: dict[str, Any], current: dict[str, Any], threshold: float=0.1) -> tuple[list[str], list[str]]:
+    """ Compares the median time of each benchmark against a saved baseline.
+        Gives a line for every benchmark in either, and the names of those more than `threshold` slower than the baseline. """
+    
+    lines = []
+    regressions = []
+    baseResults = baseline.get("results", {})
+    currentResults = current.get("results", {})
+    for name in sorted(set(baseResults) | set(currentResults)):
+        base = baseResults.get(name)
+        now = currentResults.get(name)
+        if not base or not now:
+            lines.append(f"{name}: only in {'baseline' if base else 'this run'}")
+            continue
+        if base.get("error") or now.get("error"):
+            lines.append(f"{name}: errored ({now.get('error') or 'baseline: ' + base['error']})")
+            continue
+        
+        change = now["p50Us"] / base["p50Us"] - 1 if base["p50Us"] else 0.0
+        line = f"{name}: {base['p50Us']:.1f}us -> {now['p50Us']:.1f}us ({change:+.1%})"
+        if base.get("peakMemoryBytes") and now.get("peakMemoryBytes"):
+            line += f", peak {base['peakMemoryBytes'] / 1024:.0f}KiB -> {now['peakMemoryBytes'] / 1024:.0f}KiB"
+        if change > threshold:
+            line += " REGRESSED"
+            regressions.append(name)
+        lines.append(line)
+    return lines, regressions
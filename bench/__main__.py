@@ -0,0 +1,181 @@
+""" Times the hot paths of loading and playing, for catching regressions in them.
+    Run from the repository root with `python -m bench`. Needs the game's own dependencies, but not discord.
+    
+    python -m bench --out results.json                 saves a run
+    python -m bench --baseline results.json            compares a run against a saved one, failing if anything got slower
+    python -m bench --quick --only rounds              runs fewer samples of the benchmarks whose names start with "rounds" """
+
+from __future__ import annotations
+import argparse
+import json
+import os
+import sys
+import tempfile
+from typing import Callable
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.Bench import BenchResult, compare, measure, writeResults
+from game.All import All
+from game.Character import Character
+from game.Game import Game
+from game.State import Result
+
+MYSTERYDUNGEON = ("./mysterydungeon", {"charsDirName": "../yamlsources/characters"})
+YAMLSOURCES = ("./yamlsources", {})
+# (name, characters, items, map, events) of the settings games are usually loaded with
+CONFIGS = [
+    ("all", [""], [""], "simple", [""]),
+    ("stories", ["stories"], [""], "simple", [""])
+]
+ROSTERSIZES = [24, 240, 2400]
+SEED = 0
+
+def loadAll(source: tuple[str, dict], cacheDirName: str=None) -> All:
+    rootPath, dirNames = source
+    return All(rootPath, cacheDirName=cacheDirName, **dirNames)
+
+def getRoster(characters: dict[str, Character], size: int) -> dict[str, Character]:
+    """ Makes a roster of `size` tributes by copying the loaded Characters over and over, numbering the copies. """
+    originals = [characters[name] for name in sorted(characters)]
+    roster = {}
+    for n in range(size):
+        tribute = originals[n % len(originals)].copy()
+        tribute.name = f"{tribute.name} {n // len(originals) + 1}"
+        roster[tribute.name] = tribute
+    return roster
+
+def startGame(all: All, config: tuple, tributes: dict[str, Character]=None) -> Game:
+    _, characters, items, map, events = config
+    loaded = all.loadGameWithSettings(characters, items, map, events)
+    game = Game(loaded.items, loaded.events, tributes, loaded.map, loaded.eventIndex, loaded.troveTables) if tributes != None else loaded
+    game.start(SEED)
+    game.round()
+    return game
+
+def playRound(game: Game):
+    """ Plays the rest of the round the Game is in. """
+    while game.isRoundGoing():
+        game.next()
+
+def benchLoading(scale: float) -> list[BenchResult]:
+    results = []
+    repeat = max(int(10 * scale), 3)
+    for name, source in (("mysterydungeon", MYSTERYDUNGEON), ("yamlsources", YAMLSOURCES)):
+        results.append(measure(f"allInit.{name}.cold", lambda _: loadAll(source), repeat=repeat, params={"cache": False}))
+        with tempfile.TemporaryDirectory() as cacheDir:
+            results.append(measure(f"allInit.{name}.cached", lambda _: loadAll(source, cacheDir), repeat=repeat, params={"cache": True}))
+    
+    all = loadAll(MYSTERYDUNGEON)
+    for config in CONFIGS:
+        configName, characters, items, map, events = config
+        # A fresh All is loaded for every sample, so the first load of the settings is measured rather than the memoized one
+        results.append(measure(
+            f"loadGame.{configName}.first",
+            lambda all: all.loadGameWithSettings(characters, items, map, events),
+            setup=lambda: loadAll(MYSTERYDUNGEON),
+            repeat=repeat
+        ))
+        results.append(measure(
+            f"loadGame.{configName}",
+            lambda _: all.loadGameWithSettings(characters, items, map, events),
+            number=100,
+            repeat=max(int(20 * scale), 3)
+        ))
+    return results
+
+def benchChoosing(scale: float) -> list[BenchResult]:
+    results = []
+    all = loadAll(MYSTERYDUNGEON)
+    repeat = max(int(20 * scale), 3)
+    for config in CONFIGS:
+        configName = config[0]
+        game = startGame(all, config)
+        tributes = list(game.tributes.values())
+        candidates = [(tribute, list(game.eventIndex.getCandidates(tribute))) for tribute in tributes]
+        prepares = sum(len(events) for _, events in candidates)
+        
+        def chooseAll(_):
+            for tribute in tributes:
+                game.chooseFromEvents(tribute)
+        results.append(measure(f"chooseFromEvents.{configName}", chooseAll, repeat=repeat, opsPerCall=len(tributes), params={"tributes": len(tributes)}))
+        
+        def prepareAll(_):
+            for tribute, events in candidates:
+                for event in events:
+                    event.prepare(tribute, game.population, game.runtime)
+        results.append(measure(f"prepare.{configName}", prepareAll, repeat=repeat, opsPerCall=prepares, params={"prepares": prepares}))
+        
+        # Every template of every Event a tribute can trigger right now, with the State it would be rendered with
+        renders = []
+        for tribute, events in candidates:
+            for event in events:
+                state = event.prepare(tribute, game.population, game.runtime)
+                if state:
+                    renders.extend((tribute, template, state) for template in event.templates)
+        
+        def renderAll(_):
+            for tribute, template, state in renders:
+                Result(tribute).addText(template, state)
+        results.append(measure(f"addText.{configName}", renderAll, repeat=repeat, opsPerCall=len(renders), params={"renders": len(renders)}))
+    return results
+
+def benchRounds(scale: float) -> list[BenchResult]:
+    results = []
+    all = loadAll(MYSTERYDUNGEON)
+    config = CONFIGS[0]
+    characters = all.load(config[1], all.kinds["characters"])
+    for size in ROSTERSIZES:
+        roster = getRoster(characters, size)
+        # Bigger rosters take longer per round, so fewer samples of them are taken
+        repeat = max(int(20 * scale * 24 / size), 3)
+        results.append(measure(
+            f"rounds.{size}",
+            playRound,
+            setup=lambda: startGame(all, config, roster),
+            repeat=repeat,
+            # A warm-up round of the bigger rosters would take as long as the samples, and the smaller ones already warm everything up
+            warmup=size == ROSTERSIZES[0],
+            params={"tributes": size}
+        ))
+    return results
+
+# The names each group's benchmarks start with -> the group
+GROUPS: dict[tuple[str, ...], Callable[[float], list[BenchResult]]] = {
+    ("allInit", "loadGame"): benchLoading,
+    ("chooseFromEvents", "prepare", "addText"): benchChoosing,
+    ("rounds",): benchRounds
+}
+
+def isSelected(name: str, prefixes: list[str]) -> bool:
+    return not prefixes or any(name.startswith(prefix) or prefix.startswith(name) for prefix in prefixes)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Times loading, event selection and whole rounds, and writes the results as JSON.")
+    parser.add_argument("--out", default=None, help="file to write the results to, instead of stdout")
+    parser.add_argument("--baseline", default=None, help="results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="how much slower than the baseline counts as a regression, 0.1 being 10%%")
+    parser.add_argument("--only", default="", help="space-separated prefixes of the benchmarks to keep")
+    parser.add_argument("--quick", action="store_true", help="takes a fifth of the samples")
+    args = parser.parse_args()
+    
+    # Content paths are relative to the repository root
+    os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    scale = 0.2 if args.quick else 1.0
+    prefixes = args.only.split()
+    
+    results = []
+    for names, group in GROUPS.items():
+        if not any(isSelected(name, prefixes) for name in names): continue
+        results.extend(result for result in group(scale) if not prefixes or any(result.name.startswith(prefix) for prefix in prefixes))
+    
+    current = writeResults(args.out, results)
+    
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        lines, regressions = compare(baseline, current, args.threshold)
+        print("\n".join(lines), file=sys.stderr)
+        if regressions:
+            print(f"{len(regressions)} benchmarks regressed by more than {args.threshold:.0%}", file=sys.stderr)
+            sys.exit(1)
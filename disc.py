@@ -7,8 +7,6 @@ from MainCog import MainCog
 from discord.ext import commands
 client = commands.Bot(command_prefix=".")
 client.remove_command("help")
-    
-client.add_cog(MainCog(client))
 
 @client.event
 async def on_ready():
@@ -19,4 +17,7 @@ def printCommand(ctx: Context):
     print(f"{ctx.message.author.name}: {ctx.message.content}")
     return True
 
-client.run(os.getenv("DISCORD_SECRET_THE_ANNOUNCER"))
+# Content is parsed in worker processes, which import the main module again when they're spawned rather than forked
+if __name__ == "__main__":
+    client.add_cog(MainCog(client))
+    client.run(os.getenv("DISCORD_SECRET_THE_ANNOUNCER"))
@@ -1,21 +1,27 @@
 
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 import os
 from os import stat
 import re
-from typing import Any, Callable, Union
+from typing import Any, Callable, Optional, Union
 
 from ruamel.yaml import YAML
 from ruamel.yaml.scalarstring import LiteralScalarString as YAMLString
 yaml = YAML()
 
+from game import Inflection
 from game.Character import Character
+from game.ContentCache import ContentCache, toPlain
 from game.Event import Event
+from game.EventIndex import EventIndex
 from game.Item import Item
 from game.Map import Map
+from game.Packs import ContentKind, PackIndex
+from game.Trace import EventParse, trace
 from game.Trove import Trove
 from game.Game import Game
-from game.Valids import Valids
+from game.Valids import Catalogue, Valids
 
 class LoadException(Exception):
     """ Simple class differentiating errors that happen during loading. """
@@ -26,68 +32,159 @@ semicolons = re.compile(r"\s*;\s*")
 newlines = re.compile(r"\n+")
 
 class All:
-    def __init__(self, rootPath: str, charsDirName: str="characters", itemsDirName: str="items", mapsDirName: str="maps", eventsDirName: str="events"):
+    # Fewer files than this are parsed in this process, since starting worker processes takes longer than parsing a few files
+    PARALLELMINFILES = 8
+    
+    def __init__(self, rootPath: str, charsDirName: str="characters", itemsDirName: str="items", mapsDirName: str="maps", eventsDirName: str="events", cacheDirName: Optional[str]=".hgcache", lazy: bool=False, workers: int=1):
         self.rootPath = rootPath
+        # In lazy mode, files are only indexed here and each pack is built the first time a game asks for it
+        self.lazy = lazy
+        # Number of processes YAML files are parsed in when several need parsing at once
+        self.workers = workers
+        
+        # Parsed YAML is cached on disk per file unless cacheDirName is None
+        self.cache = ContentCache(os.path.join(self.rootPath, cacheDirName)) if cacheDirName else None
         
         self.charsDirName = charsDirName
         self.characters: dict[str, dict[str, Character]] = {}
         self.allCharacters: dict[str, Character] = {}
-        res = self.build(self.charactersFromYaml, self.charsDirName)
-        if res: raise LoadException(res)
         
         self.itemsDirName = itemsDirName
         self.items: dict[str, dict[str, Item]] = {}
         self.allItems: dict[str, Item] = {}
-        res = self.build(self.itemsFromYaml, self.itemsDirName)
-        if res: raise LoadException(res)
         
         self.mapsDirName = mapsDirName
         self.maps: dict[str, Map] = {}
-        res = self.build(self.mapFromYaml, self.mapsDirName)
-        if res: raise LoadException(res)
         
         self.eventsDirName = eventsDirName
         self.events: dict[str, dict[str, Event]] = {}
-        self.allEvents: list[Event] = {}
-        res = self.build(self.eventsFromYaml, self.eventsDirName)
-        if res: raise LoadException(res)
+        
+        self.kinds: dict[str, ContentKind] = {
+            "characters": ContentKind("characters", self.charsDirName, self.charactersFromYaml, self.characters, self.allCharacters),
+            "items": ContentKind("items", self.itemsDirName, self.itemsFromYaml, self.items, self.allItems),
+            "maps": ContentKind("maps", self.mapsDirName, self.mapFromYaml, self.maps),
+            "events": ContentKind("events", self.eventsDirName, self.eventsFromYaml, self.events)
+        }
+        # Increased whenever any content changes
+        self.version = 0
+        # (item packs, map) -> the Catalogue Events loaded with them are validated against
+        self.catalogues: dict[tuple, Catalogue] = {}
+        # (event packs, item packs, map) -> loaded copies of the Events, their EventIndex, and their Catalogue
+        self.loadedEvents: dict[tuple, tuple[dict[str, Event], EventIndex, Catalogue]] = {}
+        # (kind name, packs) -> the packs merged into one dict, shared by every Game loaded with them
+        self.loadedPacks: dict[tuple, dict[str, Any]] = {}
+        
+        for kind in self.kinds.values():
+            self.index(kind, kind.dirName)
+        if not self.lazy:
+            # Parse every file up front so all of them can be spread across the workers
+            paths = {kind.files.getPath(dotsName): dotsName for kind in self.kinds.values() for dotsName in kind.files}
+            parsed = self.readYamls(paths)
+            for kind in self.kinds.values():
+                for dotsName in kind.files:
+                    self.buildFile(kind, dotsName, parsed[kind.files.getPath(dotsName)])
     
     def loadGameWithSettings(self, characters: list[str], items: list[str], map: str, events: list[str]) -> Game:
-        loadedCharacters: dict[str, Character] = All.load(characters, self.characters)
-        loadedItems: dict[str, Item] = All.load(items, self.items)
-        loadedMap: Map = All.loadOne(map, self.maps)
-        loadedEvents: dict[str, Event] = All.load(events, self.events)
+        loadedCharacters: dict[str, Character] = self.load(characters, self.kinds["characters"])
+        loadedItems: dict[str, Item] = self.load(items, self.kinds["items"])
+        loadedMap: Map = self.loadOne(map, self.kinds["maps"])
+        self.load(events, self.kinds["events"])
+        loadedEvents, eventIndex, catalogue = self.loadEvents(events, items, map, loadedItems, loadedMap)
         
+        return Game(loadedItems, loadedEvents, loadedCharacters, loadedMap, eventIndex, catalogue.troveTables)
+    
+    def getPacksKey(self, files: list[str], kind: ContentKind) -> tuple[tuple[str, int], ...]:
+        """ Identifies the current contents of the matched packs, changing whenever one of them is rebuilt. """
+        return tuple((dotsName, kind.getGeneration(dotsName)) for dotsName in self.matchPacks(files, kind))
+    
+    def loadEvents(self, events: list[str], items: list[str], map: str, loadedItems: dict[str, Item], loadedMap: Map) -> tuple[dict[str, Event], EventIndex, Catalogue]:
+        """ Gets loaded copies of the matched Events, validated against the given Items and Map, along with the Catalogue they were validated against.
+            Loaded Events are kept for each combination of event packs, item packs and map, so they're only loaded once. """
+        
+        contentKey = (self.getPacksKey(items, self.kinds["items"]), (map, self.kinds["maps"].getGeneration(map)))
+        key = (self.getPacksKey(events, self.kinds["events"]), *contentKey)
+        if key in self.loadedEvents:
+            return self.loadedEvents[key]
+        
+        catalogue = self.catalogues.get(contentKey)
+        if catalogue == None:
+            catalogue = Catalogue(loadedMap, loadedItems)
+            self.catalogues[contentKey] = catalogue
+        
+        loadedEvents: dict[str, Event] = {}
+        for dotsName, _ in key[0]:
+            for name, event in self.events[dotsName].items():
+                loadedEvent = event.copy()
+                loadedEvent.load(Valids(catalogue))
+                loadedEvents[name] = loadedEvent
+        
+        verbs = set()
         for event in loadedEvents.values():
-            valids = Valids(loadedMap, loadedItems)
-            event.load(valids)
+            for template in event.getTemplates():
+                verbs.update(tag for tag, objType, _ in template.getPlaceholders() if objType == "@" and Character.isVerbTag(tag))
+        Inflection.prewarm(verbs, loadedItems.keys())
         
-        return Game(loadedItems, loadedEvents, loadedCharacters, loadedMap)
+        self.loadedEvents[key] = (loadedEvents, EventIndex(loadedEvents.values()), catalogue)
+        return self.loadedEvents[key]
     
-    @staticmethod
-    def load(files: str, objsPerFile: dict[str, dict[str, Any]]) -> dict[str, Any]:
+    def pruneLoaded(self):
+        """ Forgets merged packs, loaded Events and Catalogues using packs which have since been rebuilt or removed. """
+        def isCurrent(packsKey: tuple[tuple[str, int], ...], kind: ContentKind) -> bool:
+            return all(dotsName in kind.files and kind.getGeneration(dotsName) == generation for dotsName, generation in packsKey)
+        
+        def isContentCurrent(itemsKey: tuple, mapKey: tuple) -> bool:
+            return isCurrent(itemsKey, self.kinds["items"]) and isCurrent((mapKey,), self.kinds["maps"])
+        
+        self.loadedPacks = {key: loaded for key, loaded in self.loadedPacks.items() if isCurrent(key[1], self.kinds[key[0]])}
+        self.catalogues = {key: catalogue for key, catalogue in self.catalogues.items() if isContentCurrent(*key)}
+        self.loadedEvents = {
+            key: loaded for key, loaded in self.loadedEvents.items()
+            if isCurrent(key[0], self.kinds["events"]) and isContentCurrent(*key[1:])
+        }
+    
+    def load(self, files: list[str], kind: ContentKind) -> dict[str, Any]:
+        """ Merges every pack whose dotted name starts with one of the given names.
+            The merged dict is kept until one of the packs changes, so it mustn't be changed. """
+        dotsNames = self.matchPacks(files, kind)
+        self.buildPacks(kind, dotsNames)
+        key = (kind.name, tuple((dotsName, kind.getGeneration(dotsName)) for dotsName in dotsNames))
+        if key in self.loadedPacks:
+            return self.loadedPacks[key]
+        
         loaded = {}
+        for dotsName in dotsNames:
+            loaded.update(self.getPack(kind, dotsName))
+        self.loadedPacks[key] = loaded
+        return loaded
+    
+    def matchPacks(self, files: list[str], kind: ContentKind) -> list[str]:
+        """ Gets the dotted names of every pack starting with one of the given names, in order. """
+        matched = []
         for file in files:
-            found = False
-            for dotsName in objsPerFile:
-                if dotsName.startswith(file):
-                    found = True
-                    toLoad = objsPerFile.get(dotsName)
-                    loaded = {**loaded, **toLoad}
-            if not found:
+            dotsNames = kind.files.matchPrefix(file)
+            if not dotsNames:
                 raise LoadException(f"Couldn't find any game object files with the name {file}")
-        return loaded
+            matched += dotsNames
+        return matched
     
-    @staticmethod
-    def loadOne(file, objDict: dict[str, object]) -> Any:
-        toLoad = objDict.get(file)
-        if not toLoad:
+    def loadOne(self, file: str, kind: ContentKind) -> Any:
+        if not file in kind.files:
             raise LoadException(f"Couldn't find any game object files with the name {file}")
-        return toLoad
+        return self.getPack(kind, file)
     
-    def dotPathToReal(self, dirName: str, dotPath: str) -> str:
-        path = os.path.join(self.rootPath, dirName, *dotPath.split("."))
-        return path + ".yaml"
+    def getPack(self, kind: ContentKind, dotsName: str) -> Any:
+        """ Gets a built pack, building it from its file first if it hasn't been yet. """
+        if not kind.isBuilt(dotsName):
+            self.buildFile(kind, dotsName)
+        return kind.objsPerFile[dotsName]
+    
+    def buildPacks(self, kind: ContentKind, dotsNames: list[str]) -> None:
+        """ Builds every pack that hasn't been built yet, parsing their files together first. """
+        toBuild = [dotsName for dotsName in dotsNames if not kind.isBuilt(dotsName)]
+        if not toBuild: return
+        parsed = self.readYamls({kind.files.getPath(dotsName): dotsName for dotsName in toBuild})
+        for dotsName in toBuild:
+            self.buildFile(kind, dotsName, parsed[kind.files.getPath(dotsName)])
     
     @staticmethod
     def getYamlFromFile(filename: str) -> dict:
@@ -96,49 +193,133 @@ class All:
             if not allYaml: allYaml = {}
             return allYaml
     
+    @staticmethod
+    def parseYaml(text: str) -> dict:
+        """ Parses YAML text into plain Python data. """
+        allYaml = yaml.load(text)
+        if not allYaml: allYaml = {}
+        return toPlain(allYaml)
+    
+    def readYaml(self, filename: str, dotsName: str) -> dict:
+        """ Gets the plain data of a YAML file, from the on-disk cache if the file hasn't changed. """
+        return self.readYamls({filename: dotsName})[filename]
+    
+    def readYamls(self, paths: dict[str, str]) -> dict[str, dict]:
+        """ Gets the plain data of several YAML files, given as paths mapped to their dotted names.
+            Files missing from the on-disk cache are parsed in a pool of worker processes when there are at least PARALLELMINFILES of them. """
+        
+        allData: dict[str, dict] = {}
+        toParse: list[str] = []
+        for path in paths:
+            data = self.cache.get(path) if self.cache else None
+            if data == None:
+                toParse.append(path)
+            else:
+                allData[path] = data
+        
+        if self.workers > 1 and len(toParse) >= All.PARALLELMINFILES:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(toParse))) as pool:
+                futures = {path: pool.submit(parseYamlFile, path) for path in toParse}
+                for path, future in futures.items():
+                    try:
+                        allData[path] = future.result()
+                    except Exception as e:
+                        raise LoadException(f"In file {paths[path]}: {e}") from e
+        else:
+            for path in toParse:
+                try:
+                    allData[path] = parseYamlFile(path)
+                except Exception as e:
+                    raise LoadException(f"In file {paths[path]}: {e}") from e
+        
+        if self.cache:
+            for path in toParse:
+                self.cache.put(path, allData[path])
+        return allData
+    
     @staticmethod
     def replaceYamlInFile(filename: str, allYaml: str) -> None:
         with open(filename, "w") as f:
             yaml.dump(allYaml, f)
             
-    def build(self, buildFun: Callable, dirName: str, baseDotsName: str="") -> None:
+    def index(self, kind: ContentKind, dirName: str, baseDotsName: str="") -> None:
+        """ Records the dotted name and path of every YAML file under the directory, without reading them. """
         path = os.path.join(self.rootPath, dirName)
-        subdirs: list[str] = []
-        files: list[str] = []
-        for fName in os.listdir(path):
+        for fName in sorted(os.listdir(path)):
             if os.path.isdir(os.path.join(path, fName)):
-                subdirs.append(fName)
-            else:
-                files.append(fName)
-                
-        for file in files:
-            if not file.endswith(".yaml"): continue
-            dotsName = file.replace(".yaml", "")
+                subDotsName = baseDotsName + "." + fName if baseDotsName else fName
+                self.index(kind, os.path.join(dirName, fName), subDotsName)
+                continue
+            if not fName.endswith(".yaml"): continue
+            dotsName = fName.replace(".yaml", "")
             if baseDotsName:
                 dotsName = baseDotsName + "." + dotsName
-            allYaml = All.getYamlFromFile(os.path.join(path, file))
-            try:
-                buildFun(dotsName, allYaml)
-            except LoadException as e:
-                raise LoadException(f"In file {dotsName}: {e}")
-        
-        for subdir in subdirs:
-            fullPath = os.path.join(dirName, subdir)
-            self.build(buildFun, fullPath, subdir)
-        
-    def create(self, name: str, data: Any, buildFun: Callable[[str, Any], Any], objsPerFile: dict[str, dict[str, Any]], allObjs: dict[str, Any], dotFileName) -> None:
-        if not dotFileName in objsPerFile: raise LoadException(f"Couldn't find a file at {dotFileName}")
+            kind.files.add(dotsName, os.path.join(path, fName))
+    
+    def buildFile(self, kind: ContentKind, dotsName: str, allYaml: dict=None) -> None:
+        path = kind.files.getPath(dotsName)
+        signature = All.getSignature(path)
+        if allYaml == None:
+            allYaml = self.readYaml(path, dotsName)
+        try:
+            kind.buildFun(dotsName, allYaml)
+        except LoadException as e:
+            raise LoadException(f"In file {dotsName}: {e}")
+        kind.signatures[dotsName] = signature
+    
+    @staticmethod
+    def getSignature(path: str) -> tuple[int, int]:
+        stat = os.stat(path)
+        return (stat.st_size, stat.st_mtime_ns)
+    
+    def reload(self) -> dict[str, dict[str, list[str]]]:
+        """ Picks up added, changed, and removed files under the content directories.
+            Only the packs of changed and added files are parsed and built again, and only the Events depending on them are validated again.
+            Returns the dotted names of the added, changed, and removed files of each kind. """
+        
+        changes: dict[str, dict[str, list[str]]] = {}
+        for kind in self.kinds.values():
+            oldFiles = kind.files
+            kind.files = PackIndex()
+            self.index(kind, kind.dirName)
+            
+            added = [dotsName for dotsName in kind.files if not dotsName in oldFiles]
+            removed = [dotsName for dotsName in oldFiles if not dotsName in kind.files]
+            changed = [
+                dotsName for dotsName in kind.files
+                if kind.isBuilt(dotsName) and kind.signatures.get(dotsName) != All.getSignature(kind.files.getPath(dotsName))
+            ]
+            
+            for dotsName in removed + changed:
+                kind.unbuild(dotsName)
+            # Unbuilt packs of lazy instances are picked up whenever they're first asked for
+            self.buildPacks(kind, changed + ([] if self.lazy else added))
+            
+            changes[kind.name] = {"added": added, "changed": changed, "removed": removed}
+            if added or changed or removed:
+                self.version += 1
+        self.pruneLoaded()
+        return changes
+        
+    def create(self, name: str, data: Any, buildFun: Callable[[str, Any], Any], kind: ContentKind, allObjs: dict[str, Any], dotFileName) -> None:
+        if not dotFileName in kind.files: raise LoadException(f"Couldn't find a file at {dotFileName}")
+        pack = self.getPack(kind, dotFileName)
         if name in allObjs: raise LoadException(f"Tried to create duplicate `{name}`")
         
-        targetFilePath = self.dotPathToReal(self.charsDirName, dotFileName)
+        targetFilePath = kind.files.getPath(dotFileName)
         allYaml = All.getYamlFromFile(targetFilePath)
         
         new = buildFun(name, data)
         allYaml[name] = data
         All.replaceYamlInFile(targetFilePath, allYaml)
         
-        objsPerFile[dotFileName][name] = new
+        pack[name] = new
         allObjs[name] = new
+        # The pack already has the new object, so it doesn't need to be rebuilt on reload
+        kind.signatures[dotFileName] = All.getSignature(targetFilePath)
+        kind.generations[dotFileName] = kind.getGeneration(dotFileName) + 1
+        self.version += 1
+        self.pruneLoaded()
     
     ###
     # Character
@@ -176,7 +357,7 @@ class All:
         self.characters[dotsName] = chars
     
     def addCharacter(self, name: str, data: tuple[str, str], dotFileName="adds"):
-        self.create(name, data, All.characterFromYaml, self.characters, self.allCharacters, dotFileName)
+        self.create(name, data, All.characterFromYaml, self.kinds["characters"], self.allCharacters, dotFileName)
     
     ###
     # Item
@@ -201,7 +382,7 @@ class All:
         self.items[dotsName] = items
     
     def addItem(self, name: str, data: str, dotFileName="adds"):
-        self.create(name, data, All.itemFromYaml, self.items, self.allItems, dotFileName)
+        self.create(name, data, All.itemFromYaml, self.kinds["items"], self.allItems, dotFileName)
     
     ###
     # Map
@@ -259,7 +440,8 @@ class All:
         
         if not isinstance(data, dict): raise LoadException(f"Data for event {name} was not a dict (got: {data})")
         
-        print(f"Beginning load for event {name}")
+        if trace.enabled:
+            trace.record(EventParse(name))
         
         subEvents = []
         
@@ -313,6 +495,11 @@ class All:
             
         self.events[dotsName] = events
 
+def parseYamlFile(filename: str) -> dict:
+    """ Reads and parses a YAML file into plain data. Kept at module level so worker processes can run it. """
+    with open(filename, "r") as f:
+        return All.parseYaml(f.read())
+
 if __name__ == "__main__":
     all = All("./yamlsources")
     print(all.characters)
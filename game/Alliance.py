@@ -0,0 +1,40 @@
+from __future__ import annotations
+from itertools import count
+from typing import TYPE_CHECKING, Iterator
+
+if TYPE_CHECKING:
+    from game.Character import Character
+
+# Source of Alliance ids, unique within the process
+_ids = count()
+
+class Alliance:
+    """ A group of allied Characters.
+        Members are kept in a dict used as an ordered set, so membership checks, joining, and leaving are constant time. """
+    
+    def __init__(self):
+        self.id = next(_ids)
+        self.members: dict[Character, None] = {}
+    
+    def __repr__(self):
+        return f"Alliance {self.id} ({', '.join(member.getName() for member in self.members)})"
+    
+    def __len__(self):
+        return len(self.members)
+    
+    def __iter__(self) -> Iterator[Character]:
+        return iter(self.members)
+    
+    def __contains__(self, char: Character) -> bool:
+        return char in self.members
+    
+    def getId(self) -> int:
+        return self.id
+    
+    def add(self, char: Character):
+        """ Called by Character.joinAlliance. """
+        self.members[char] = None
+    
+    def remove(self, char: Character):
+        """ Called by Character.leaveAlliance. """
+        self.members.pop(char, None)
@@ -1,30 +1,43 @@
 
 from __future__ import annotations
-import inflect
-p = inflect.engine()
+from itertools import count
+from random import Random
 import re
-from typing import Callable, Optional
+from typing import TYPE_CHECKING, Callable, Optional
 
-from game.Item import Item
-from game.Map import Zone
+from game.Alliance import Alliance
+from game.Inflection import conjugate
+from game.Item import Item, compileTags
+from game.Map import Map, Zone
+if TYPE_CHECKING:
+    from game.Population import Population
 
 class Tag:
-    def __init__(self, name: str, lasts: int, forever: bool=False):
+    """ A named marker on a Character.
+        Rather than being changed every round, a Tag's age is worked out from the age its owner had when it was added. """
+    
+    def __init__(self, name: str, lasts: int, forever: bool=False, owner: Character=None):
         self.name = name
-        self.age = lasts
+        self.lasts = lasts
         self.forever = forever
+        self.owner = owner
+        self.born = owner.getAge() if owner else 0
     
     def __str__(self):
         return f"Tag {self.name} ({self.age})"
     
-    def changeAge(self):
+    @property
+    def age(self) -> int:
+        """ Counts up from 0 for forever Tags and down from `lasts` otherwise. """
+        elapsed = (self.owner.getAge() if self.owner else self.born) - self.born
         if self.forever:
-            self.age += 1
-        else:
-            self.age -= 1
+            return elapsed
+        return self.lasts - elapsed
     
-    def isExpired(self):
-        return self.age < 0
+    def getExpiry(self) -> Optional[int]:
+        """ Gets the owner age at which this Tag expires, or None if it lasts forever. """
+        if self.forever: return None
+        return self.born + self.lasts + 1
 
 def _match_url(url):
     regex = re.compile(
@@ -34,9 +47,35 @@ def _match_url(url):
         return True
     else:
         return False
+
+# Source of Character ids, unique within the process
+_ids = count()
+
+class Character:
+    # Text tag -> what it's replaced by for a Character, rather than being conjugated as a verb
+    REPLACES: dict[str, Callable[[Character], str]] = {
+        "they": lambda char: char.subj,
+        "them": lambda char: char.obj,
+        "their": lambda char: char.plur1,
+        "theirs": lambda char: char.plur2,
+        "themself": lambda char: char.flex,
+        "they're": lambda char: char.subj + ("'re" if char.plural else "'s"),
+        "they've": lambda char: char.subj + ("'ve" if char.plural else "'s"),
+        "they'll": lambda char: char.subj + "'ll",
+        "weren't": lambda char: "weren't" if char.plural else "wasn't",
+        "haven't": lambda char: "haven't" if char.plural else "hasn't",
+        "aren't": lambda char: "aren't" if char.plural else "isn't",
+        "don't": lambda char: "don't" if char.plural else "doesn't",
+        "were": lambda char: "were" if char.plural else "was",
+        "are": lambda char: "are" if char.plural else "is",
         
-class Character:    
+        "put": lambda char: "put" if char.plural else "puts",
+    }
+    replacedTags = frozenset(REPLACES)
+    
     def __init__(self, name: str, imgSrc: str, pronouns: tuple[str, str, str, str, str]):
+        # Stable identity used for hashing and equality
+        self.id = next(_ids)
         self.name = name
         self.imgSrc = imgSrc if _match_url(imgSrc) else None
         if not self.imgSrc:
@@ -45,33 +84,20 @@ class Character:
         self.subj, self.obj, self.plur1, self.plur2, self.flex = pronouns
         self.plural = self.subj == "they"
         
-        self.replaces = {
-            "they": self.subj,
-            "them": self.obj,
-            "their": self.plur1,
-            "theirs": self.plur2,
-            "themself": self.flex,
-            "they're": self.subj + ("'re" if self.plural else "'s"),
-            "they've": self.subj + ("'ve" if self.plural else "'s"),
-            "they'll": self.subj + "'ll",
-            "weren't": "weren't" if self.plural else "wasn't",
-            "haven't": "haven't" if self.plural else "hasn't",
-            "aren't": "aren't" if self.plural else "isn't",
-            "don't": "don't" if self.plural else "doesn't",
-            "were": "were" if self.plural else "was",
-            "are": "are" if self.plural else "is",
-            
-            "put": "put" if self.plural else "puts",
-        }
+        self.replaces = {tag: replace(self) for tag, replace in Character.REPLACES.items()}
         
         self.alive: bool = True
         self.items: list[Item] = []
-        self.tags: list[Tag] = []
-        self.alliance: list[Character] = []
+        self.tags: dict[str, Tag] = {}
+        # Owner age -> Tags which expire when the Character reaches it
+        self.tagExpiry: dict[int, list[Tag]] = {}
+        self.alliance: Optional[Alliance] = None
         self.status: Optional[Tag] = None
         self.location: Zone = None
         self.age: int = 0
         self.roundsSurvived: int = 0
+        # The indexes of the Game this Character is playing in, kept up to date by the Character
+        self.population: Optional[Population] = None
     
     def __repr__(self):
         return f"Character \"{self.name}\""
@@ -80,13 +106,24 @@ class Character:
         return self.string()
     
     def __hash__(self) -> int:
-        return hash((
-            self.name,
-            self.imgSrc,
-            self.subj, self.obj, self.plur1, self.plur2, self.flex, self.plural
-        ))
+        return self.id
     
     def __eq__(self, o: object) -> bool:
+        if not type(o) == Character: return False
+        return self.id == o.id
+    
+    def copy(self) -> Character:
+        """ Gets a Character with the same name, picture and pronouns to play in a Game of its own.
+            The copy has a new identity and a fresh game state, while sharing everything that doesn't change during a Game. """
+        copied = Character.__new__(Character)
+        copied.__dict__.update(self.__dict__)
+        copied.id = next(_ids)
+        copied.population = None
+        copied.reset()
+        return copied
+    
+    def deepEquals(self, o: object) -> bool:
+        """ Compares every field of two Characters rather than their identities. """
         if not type(o) == Character: return False
         return all([
             self.name == o.name,
@@ -107,28 +144,77 @@ class Character:
     def reset(self):
         self.alive = True
         self.items = []
-        self.tags = []
-        self.alliance = []
+        self.tags = {}
+        self.tagExpiry = {}
+        self.alliance = None
         self.location = None
         self.status = None
         self.age = 0
         self.roundsSurvived = 0
     
+    def getCheckpoint(self) -> tuple:
+        """ Gets everything about this Character which changes during a Game, with game objects referenced by name. """
+        return (
+            self.alive,
+            self.age,
+            self.roundsSurvived,
+            self.location.name if self.location else None,
+            [(tag.name, tag.lasts, tag.forever, tag.born) for tag in self.tags.values()],
+            (self.status.name, self.status.born) if self.status else None,
+            [item.name for item in self.items],
+            self.alliance.getId() if self.alliance else None
+        )
+    
+    def restoreCheckpoint(self, data: tuple, map: Map, items: dict[str, Item], alliances: dict[int, Alliance]):
+        """ Sets this Character back to a checkpoint made by `getCheckpoint`.
+            Alliances are shared through the given dict, keyed by the ids they had when checkpointed.
+            Doesn't update the Character's Population, which has to be rebuilt afterwards. """
+        
+        alive, age, roundsSurvived, locationName, tags, status, itemNames, allianceId = data
+        self.alive = alive
+        self.age = age
+        self.roundsSurvived = roundsSurvived
+        
+        self.location = map.getZone(locationName) if locationName != None else None
+        if locationName != None and not self.location:
+            raise Exception(f"Couldn't find the checkpointed zone \"{locationName}\" of {self.name}")
+        
+        self.tags = {}
+        self.tagExpiry = {}
+        for name, lasts, forever, born in tags:
+            tag = Tag(name, lasts, forever, self)
+            tag.born = born
+            self.tags[name] = tag
+            if not forever:
+                self.tagExpiry.setdefault(tag.getExpiry(), []).append(tag)
+        
+        self.status = None
+        if status:
+            name, born = status
+            self.status = Tag(name, 0, True, self)
+            self.status.born = born
+        
+        self.items = []
+        for name in itemNames:
+            if not name in items: raise Exception(f"Couldn't find the checkpointed item \"{name}\" of {self.name}")
+            self.items.append(items[name].copy())
+        
+        self.alliance = None
+        if allianceId != None:
+            if not allianceId in alliances:
+                alliances[allianceId] = Alliance()
+            self.alliance = alliances[allianceId]
+            self.alliance.add(self)
+    
     def incAge(self):
         self.age += 1
         if self.isAlive():
             self.roundsSurvived += 1
         
-        if self.status:
-            self.status.changeAge()
-        
-        toRemove: list[Tag] = []
-        for tag in self.tags:
-            tag.changeAge()
-            if tag.isExpired():
-                toRemove.append(tag)
-        for tag in toRemove:
-            self.tags.remove(tag)
+        for tag in self.tagExpiry.pop(self.age, []):
+            # The Tag might have been removed or replaced since it was scheduled
+            if self.tags.get(tag.name) is tag:
+                del self.tags[tag.name]
     
     ###
     #
@@ -163,7 +249,7 @@ class Character:
     
     def getName(self) -> str:
         return self.name
-        
+    
     def string(self, tag: str = None) -> str:
         toRet = self.name
         if tag:
@@ -174,11 +260,16 @@ class Character:
                 # the tag is a verb to conjugate
                 toRet = tag
                 if not self.plural:
-                    toRet = p.plural(tag)
+                    toRet = conjugate(tag)
             if tag == None or tag[0].isupper():
                 return toRet[0].capitalize() + toRet[1:]
         return toRet
     
+    @staticmethod
+    def isVerbTag(tag: str) -> bool:
+        """ Gets whether a text tag is a verb which is conjugated for singular Characters. """
+        return bool(tag) and not tag.lower() in Character.replacedTags
+    
     # Location
     
     def getLocation(self) -> Zone:
@@ -193,8 +284,11 @@ class Character:
     # Items
     
     def getItemByTags(self, tags: list[str]) -> Optional[Item]:
+        return self.getItemByTagMask(compileTags(tags))
+    
+    def getItemByTagMask(self, mask: Optional[int]) -> Optional[Item]:
         for item in self.items:
-            if item.hasAllTags(tags):
+            if item.hasTagMask(mask):
                 return item
         return None
     
@@ -206,11 +300,8 @@ class Character:
     
     # Tags
     
-    def getTag(self, tagName: str):
-        for tag in self.tags:
-            if tag.name == tagName:
-                return tag
-        return None
+    def getTag(self, tagName: str) -> Optional[Tag]:
+        return self.tags.get(tagName)
     
     def hasTag(self, tagName: str):
         if tagName.startswith("!"):
@@ -225,12 +316,13 @@ class Character:
     # Relations
     
     def isAlone(self):
-        return len(self.alliance) == 0
+        return self.alliance == None
     
-    def getAlliance(self):
+    def getAlliance(self) -> Optional[Alliance]:
         return self.alliance
-        
+    
     def isAllyOf(self, other: Character):
+        if not self.alliance: return False
         return other in self.alliance
     
     # Display
@@ -248,7 +340,7 @@ class Character:
     
     def getTagsStr(self):
         if not self.tags: return "No tags"
-        return ", ".join([tag.name for tag in self.tags])
+        return ", ".join(self.tags)
     
     def getAllianceStr(self):
         if not self.alliance: return "No alliance"
@@ -267,27 +359,32 @@ class Character:
     
     def kill(self):
         self.alive = False
+        if self.population:
+            self.population.died(self)
     
     def revive(self):
         self.alive = True
+        if self.population:
+            self.population.revived(self)
     
     # Tags
     
     def addTag(self, tag: str, lasts: int=None):
-        if self.hasTag(tag): return
+        if tag in self.tags: return
         if lasts:
-            self.tags.append(Tag(tag, lasts))
+            newTag = Tag(tag, lasts, False, self)
+            self.tagExpiry.setdefault(newTag.getExpiry(), []).append(newTag)
         else:
-            self.tags.append(Tag(tag, 0, True))
+            newTag = Tag(tag, 0, True, self)
+        self.tags[tag] = newTag
     
     def removeTag(self, tagName: str):
-        tag = self.getTag(tagName)
-        self.tags.remove(tag)
+        self.tags.pop(tagName, None)
     
     # Status
     
     def makeStatus(self, name: str):
-        self.status = Tag(name, 0, True)
+        self.status = Tag(name, 0, True, self)
     
     def clearStatus(self):
         self.status = None
@@ -304,16 +401,23 @@ class Character:
     # Locations
     
     def move(self, newLocation: Zone):
+        oldLocation = self.location
         self.location = newLocation
+        if self.population:
+            self.population.moved(self, oldLocation, newLocation)
     
-    def moveRandom(self):
-        self.move(self.location.getRandomConnection())
+    def moveRandom(self, rng: Random=None):
+        self.move(self.location.getRandomConnection(rng))
     
-    def joinAlliance(self, alliance: list[Character]):
+    def joinAlliance(self, alliance: Alliance):
         self.alliance = alliance
-        self.alliance.append(self)
+        self.alliance.add(self)
+        if self.population:
+            self.population.joined(self)
     
     def leaveAlliance(self):
         if self.isAlone(): return
         self.alliance.remove(self)
-        self.alliance = []
+        self.alliance = None
+        if self.population:
+            self.population.left(self)
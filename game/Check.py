@@ -1,21 +1,38 @@
 
 from __future__ import annotations
 from abc import abstractmethod
-from random import choice
-
-from typing import Type, Union
+import operator
+from typing import Callable, Optional, Type, Union
 
 from game.Character import Character
-from game.Item import Item
+from game.Item import Item, compileTags
 from game.State import State
 from game.Valids import EventPart, Suite, Valids
 
+# Compiled checks take the same arguments as Check.check
+CompiledCheck = Callable[[Character, State], bool]
+
+COMPARISONS: dict[str, Callable[[int, int], bool]] = {
+    "=": operator.eq,
+    "!": operator.ne,
+    "<": operator.lt,
+    ">": operator.gt
+}
+
 class Check(EventPart):
+    # Whether the Check only reads the Character and State.
+    # Checks that add to the State or use up randomness or Troves are run last in a compiled Suite.
+    pure = True
+    
     @abstractmethod
     def check(self, char: Character, state: State) -> bool:
         """ Checks to see if the Character meets this Check.
             Returns True if so, False otherwise. """
         pass
+    
+    def compile(self) -> CompiledCheck:
+        """ Gets a function equivalent to this Check's `check` with its arguments resolved ahead of time. """
+        return self.check
 
 class DistanceCheck(Check):
     NEARBY = "nearby"
@@ -33,6 +50,12 @@ class DistanceCheck(Check):
             return char.isNearby(target)
         else:
             return True
+    
+    def compile(self) -> CompiledCheck:
+        if self.state != DistanceCheck.NEARBY:
+            return lambda char, state: True
+        targetShort = self.targetShort
+        return lambda char, state: char.isNearby(state.getChar(targetShort))
 
 class AliveCheck(Check):
     ALIVE = "alive"
@@ -49,6 +72,11 @@ class AliveCheck(Check):
             return char.isAlive()
         else:
             return not char.isAlive()
+    
+    def compile(self) -> CompiledCheck:
+        if self.aState == AliveCheck.ALIVE:
+            return lambda char, state: char.isAlive()
+        return lambda char, state: not char.isAlive()
 
 class AloneCheck(Check):
     ALONE = "alone"
@@ -66,6 +94,11 @@ class AloneCheck(Check):
         if self.state == AloneCheck.ALLIED and not char.isAlone():
             return True
         return False
+    
+    def compile(self) -> CompiledCheck:
+        if self.state == AloneCheck.ALONE:
+            return lambda char, state: char.isAlone()
+        return lambda char, state: not char.isAlone()
 
 class RelationCheck(Check):
     ALLY = "ally"
@@ -85,6 +118,12 @@ class RelationCheck(Check):
         if self.relationship == RelationCheck.ENEMY and not char.isAllyOf(target):
             return True
         return False
+    
+    def compile(self) -> CompiledCheck:
+        targetShort = self.targetShort
+        if self.relationship == RelationCheck.ALLY:
+            return lambda char, state: char.isAllyOf(state.getChar(targetShort))
+        return lambda char, state: not char.isAllyOf(state.getChar(targetShort))
 
 class ComparisonCheck(Check):
     args = ["comparison", "number"]
@@ -104,12 +143,23 @@ class ComparisonCheck(Check):
             return self.getVal(char) < self.number
         if self.comp == ">":
             return self.getVal(char) > self.number
+    
+    def compile(self) -> CompiledCheck:
+        comp = COMPARISONS[self.comp]
+        number = self.number
+        getVal = self.getVal
+        return lambda char, state: comp(getVal(char), number)
 
 class RoundCheck(ComparisonCheck):
     matches = ["round"]
     
     def getVal(self, char: Character) -> int:
         return char.getAge()
+    
+    def compile(self) -> CompiledCheck:
+        comp = COMPARISONS[self.comp]
+        number = self.number
+        return lambda char, state: comp(char.getAge(), number)
 
 class StatusCheck(ComparisonCheck):
     args = ["any", "comparison?", "number?"]
@@ -127,14 +177,20 @@ class StatusCheck(ComparisonCheck):
     
     def check(self, char: Character, state: State) -> bool:
         if not char.hasStatus(self.status): return False
-        super().check(char, state)
+        return super().check(char, state)
+    
+    def compile(self) -> CompiledCheck:
+        status = self.status
+        comp = COMPARISONS[self.comp]
+        number = self.number
+        return lambda char, state: char.hasStatus(status) and comp(char.getStatusAge(), number)
 
 class TagCheck(ComparisonCheck):
     args = ["new char tag", "comparison?", "number?"]
     matches = ["tag"]
     
     def __init__(self, valids: Valids, *args: str):
-        _, self.tag, self.comp, self.age = args
+        _, self.tag, self.comp, self.number = args
         self.flip = self.tag.startswith("!")
         
         if self.flip: self.tag = self.tag[1:]
@@ -144,19 +200,35 @@ class TagCheck(ComparisonCheck):
     
     def check(self, char: Character, state: State) -> bool:
         if not char.hasTag(self.tag): return True if self.flip else False
-        res = super().check(char, state)
+        # Without a comparison, having the tag is enough
+        res = super().check(char, state) if self.comp else True
         return (not res) if self.flip else res
+    
+    def compile(self) -> CompiledCheck:
+        tag = self.tag
+        flip = self.flip
+        if not self.comp:
+            return lambda char, state: char.hasTag(tag) != flip
+        comp = COMPARISONS[self.comp]
+        number = self.number
+        def compiled(char: Character, state: State) -> bool:
+            age = char.getTagAge(tag)
+            if age == None: return flip
+            return comp(age, number) != flip
+        return compiled
 
 class ItemCheck(Check):
     args = ["new item short", "*item tag"]
     matches = ["item"]
+    pure = False
     
     def __init__(self, valids: Valids, *args: str):
         _, self.itemShort, *itemTags = args
         self.itemTags = itemTags
+        self.itemMask = compileTags(self.itemTags)
     
     def get(self, char: Character):
-        return char.getItemByTags(self.itemTags)
+        return char.getItemByTagMask(self.itemMask)
     
     def check(self, char: Character, state: State) -> bool:
         item = self.get(char)
@@ -181,13 +253,19 @@ class NeedsCheck(Check):
     def __init__(self, valids: Valids, *args: str):
         _, *itemTags = args
         self.itemTags = itemTags
+        self.itemMask = compileTags(self.itemTags)
     
     def check(self, char: Character, state: State) -> bool:
-        return char.getItemByTags(self.itemTags) == False
+        return char.getItemByTagMask(self.itemMask) == None
+    
+    def compile(self) -> CompiledCheck:
+        itemMask = self.itemMask
+        return lambda char, state: char.getItemByTagMask(itemMask) == None
 
 class CreateCheck(Check):
     args = ["new item short", "*item tag"]
     matches = ["create"]
+    pure = False
     
     def __init__(self, valids: Valids, *args: str):
         _, self.itemShort, *itemTags = args
@@ -196,7 +274,7 @@ class CreateCheck(Check):
         self.items: list[Item] = valids.getLoadedItemsWithTags(self.itemTags)
     
     def check(self, char: Character, state: State) -> bool:
-        item = choice(self.items)
+        item = state.rng.choice(self.items)
         state.setItem(self.itemShort, item)
         return True
 
@@ -217,6 +295,10 @@ class LocationCheck(Check):
     
     def check(self, char: Character, state: State) -> bool:
         return char.isIn(self.locName)
+    
+    def compile(self) -> CompiledCheck:
+        locName = self.locName
+        return lambda char, state: char.isIn(locName)
 
 class LimitCheck(Check):
     TOTAL = "limittotal"
@@ -233,24 +315,33 @@ class LimitCheck(Check):
             return state.getTriggersFor(char) <= self.count
         else:
             return state.getTotalTriggers() <= self.count
+    
+    def compile(self) -> CompiledCheck:
+        count = self.count
+        if self.cType == LimitCheck.PERCHAR:
+            return lambda char, state: state.getTriggersFor(char) <= count
+        return lambda char, state: state.getTotalTriggers() <= count
 
 class TroveCheck(Check):
     args = ["new item short", "trove name"]
     matches = ["loot"]
+    pure = False
     
     def __init__(self, valids: Valids, *args: str):
         _, self.newItemShort, troveName = args
         self.trove = valids.getLoadedTroveWithName(troveName)
     
     def check(self, char: Character, state: State) -> bool:
-        if not self.trove.hasItems():
+        gen = state.runtime.getTroveGen(self.trove)
+        if not gen:
             return False
-        state.setItem(self.newItemShort, self.trove.loot())
+        state.setItem(self.newItemShort, state.runtime.getTroveTable(self.trove).loot(gen, state.rng))
         return True
 
 class AddChanceCheck(Check):
     args = ["number?"]
     matches = ["luck"]
+    pure = False
     
     def __init__(self, valids: Valids, *args: str):
         _, self.number = args
@@ -280,11 +371,23 @@ ALLCHECKCLASSES: list[Type[EventPart]] = [
 ]
 
 class CheckSuite(Suite):
+    # Set to run every Suite through the interpreted `checkAll` instead of its compiled function, for debugging
+    interpreted = False
+    
     def __init__(self, charShort: str, argsLists: list[list[str]]):
         super().__init__(charShort, argsLists)
         
         self.checks: list[Check] = []
         self.isSubEvent: bool = False
+        self.compiled: CompiledCheck = self.checkAll
+        
+        # Static requirements, used to narrow down which Characters need to be checked
+        self.requiresAlive: Optional[bool] = None
+        self.requiresAlone: Optional[bool] = None
+        self.requiresNearby: bool = False
+        self.nearbyShort: Optional[str] = None
+        self.zoneName: Optional[str] = None
+        self.allyShort: Optional[str] = None
     
     def load(self, valids: Valids, isSubEvent: bool=False):
         self.checks = []
@@ -297,10 +400,52 @@ class CheckSuite(Suite):
                 self.checks.insert(0, AliveCheck(valids, AliveCheck.ALIVE))
             if (not any([type(check) == RoundCheck for check in self.checks])):
                 self.checks.insert(0, RoundCheck(valids, None, "!", 1))
+        self.compile()
     
     def addNearbyCheckIfNeeded(self, valids: Valids):
-        if (not any([type(check) == AliveCheck for check in self.checks])):
+        if (not any([type(check) == DistanceCheck for check in self.checks])):
             self.checks.insert(0, DistanceCheck(valids, DistanceCheck.NEARBY, None))
+            self.compile()
+    
+    def compile(self):
+        """ Turns the loaded Checks into a single function.
+            Checks which only read the Character run before the ones that change the State, and the status gate of `checkAll` is resolved up front. """
+        ordered = [check for check in self.checks if check.pure] + [check for check in self.checks if not check.pure]
+        tests = tuple(check.compile() for check in ordered)
+        # Characters with a status only match Suites that check for one
+        gated = not self.isSubEvent and not any([type(check) == StatusCheck for check in self.checks])
+        
+        self.requiresAlive = None
+        self.requiresAlone = None
+        self.requiresNearby = False
+        self.nearbyShort = None
+        self.zoneName = None
+        self.allyShort = None
+        for check in self.checks:
+            if type(check) == AliveCheck:
+                self.requiresAlive = check.aState == AliveCheck.ALIVE
+            elif type(check) == AloneCheck:
+                self.requiresAlone = check.state == AloneCheck.ALONE
+            elif type(check) == DistanceCheck and check.state == DistanceCheck.NEARBY:
+                self.requiresNearby = True
+                self.nearbyShort = check.targetShort
+            elif type(check) == LocationCheck:
+                self.zoneName = check.locName
+            elif type(check) == RelationCheck and check.relationship == RelationCheck.ALLY:
+                self.allyShort = check.targetShort
+        
+        def compiled(char: Character, state: State) -> bool:
+            if gated and char.status: return False
+            for test in tests:
+                if not test(char, state): return False
+            return True
+        self.compiled = compiled
+    
+    def check(self, char: Character, state: State) -> bool:
+        """ Checks the Character against every Check in this Suite. """
+        if CheckSuite.interpreted:
+            return self.checkAll(char, state)
+        return self.compiled(char, state)
     
     def checkAll(self, char: Character, state: State):
         if char.status and not self.isSubEvent:
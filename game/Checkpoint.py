@@ -0,0 +1,116 @@
+from __future__ import annotations
+import marshal
+import os
+import struct
+import zlib
+from typing import Any, Optional
+
+class Checkpointer:
+    """ Keeps a file up to date with the progress of a Game, so it can be continued after a restart.
+        The file starts with a header, followed by frames of zlib-compressed marshal data, each prefixed with its kind and length.
+        The first frame is a full checkpoint, rewritten at the start of every round. After that, each save only appends what changed since the last one,
+        as given by Game.getCheckpoint with `changesOnly` set.
+        Content is referenced by name, so a checkpoint can be restored into any Game loaded with the same content. """
+    
+    MAGIC = b"HGCK"
+    VERSION = 1
+    
+    HEADER = struct.Struct(">4sH")
+    FRAMEHEADER = struct.Struct(">BI")
+    FULL = 0
+    DELTA = 1
+    # Deltas are written every turn and mostly hold the random stream's state, which barely compresses, so they're compressed as fast as possible
+    DELTALEVEL = 1
+    # Keys whose values in a delta are added to the end of the checkpoint's, rather than replacing them
+    APPENDED = ("log",)
+    
+    def __init__(self, path: str, meta: Optional[dict]=None):
+        self.path = path
+        # Stored with every full checkpoint, such as the settings the Game was loaded with
+        self.meta = meta
+        # The round of the last full checkpoint, since changes are only appended to it within the same round
+        self.round: Optional[int] = None
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    
+    def needsFull(self, rounds: int) -> bool:
+        """ Gets whether the next save has to be a full checkpoint, rather than the changes since the last one. """
+        return self.round != rounds or not os.path.exists(self.path)
+    
+    def writeFull(self, checkpoint: dict):
+        tempPath = self.path + ".tmp"
+        with open(tempPath, "wb") as f:
+            f.write(Checkpointer.HEADER.pack(Checkpointer.MAGIC, Checkpointer.VERSION))
+            f.write(Checkpointer.encodeFrame(Checkpointer.FULL, {"meta": self.meta, "checkpoint": checkpoint}))
+        os.replace(tempPath, self.path)
+        self.round = checkpoint["rounds"]
+    
+    def writeDelta(self, delta: dict):
+        """ Appends the changes since the last save, made by Game.getCheckpoint with `changesOnly` set. """
+        with open(self.path, "ab") as f:
+            f.write(Checkpointer.encodeFrame(Checkpointer.DELTA, delta, Checkpointer.DELTALEVEL))
+    
+    def clear(self):
+        """ Removes the checkpoint file, such as when the Game is over. """
+        self.round = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+    
+    @staticmethod
+    def applyDelta(checkpoint: dict, delta: dict):
+        """ Applies saved changes to a checkpoint. Dict entries are updated one level deep, so a delta only needs the changed Characters and Events. """
+        for key, val in delta.items():
+            if key in Checkpointer.APPENDED and checkpoint.get(key) != None and val != None:
+                checkpoint[key] = checkpoint[key] + val
+            elif isinstance(val, dict) and isinstance(checkpoint.get(key), dict):
+                checkpoint[key].update(val)
+            else:
+                checkpoint[key] = val
+    
+    @staticmethod
+    def encodeFrame(kind: int, data: Any, level: int=6) -> bytes:
+        payload = zlib.compress(marshal.dumps(data, 4), level)
+        return Checkpointer.FRAMEHEADER.pack(kind, len(payload)) + payload
+    
+    @staticmethod
+    def load(path: str) -> Optional[tuple[Optional[dict], dict]]:
+        """ Reads a checkpoint file, giving its meta and the latest checkpoint, or None if there is no file.
+            A frame cut off by a crash while writing is ignored, so the checkpoint before it is given. """
+        
+        if not os.path.exists(path): return None
+        with open(path, "rb") as f:
+            data = f.read()
+        
+        if len(data) < Checkpointer.HEADER.size:
+            raise CheckpointException(f"Checkpoint {path} is too short")
+        magic, version = Checkpointer.HEADER.unpack_from(data)
+        if magic != Checkpointer.MAGIC:
+            raise CheckpointException(f"{path} isn't a checkpoint file")
+        if version != Checkpointer.VERSION:
+            raise CheckpointException(f"Checkpoint {path} has version {version}, expected {Checkpointer.VERSION}")
+        
+        meta = None
+        checkpoint = None
+        pos = Checkpointer.HEADER.size
+        while pos + Checkpointer.FRAMEHEADER.size <= len(data):
+            kind, length = Checkpointer.FRAMEHEADER.unpack_from(data, pos)
+            pos += Checkpointer.FRAMEHEADER.size
+            if pos + length > len(data): break
+            try:
+                frame = marshal.loads(zlib.decompress(data[pos:pos + length]))
+            except (zlib.error, ValueError, EOFError, TypeError):
+                break
+            pos += length
+            
+            if kind == Checkpointer.FULL:
+                meta = frame["meta"]
+                checkpoint = frame["checkpoint"]
+            elif kind == Checkpointer.DELTA and checkpoint != None:
+                Checkpointer.applyDelta(checkpoint, frame)
+        
+        if checkpoint == None:
+            raise CheckpointException(f"Checkpoint {path} has no full checkpoint")
+        return meta, checkpoint
+
+class CheckpointException(Exception):
+    """ Raised when a checkpoint file can't be read. """
+    pass
@@ -0,0 +1,105 @@
+from __future__ import annotations
+import hashlib
+import os
+import pickle
+import tempfile
+from typing import Any, Optional
+
+class ContentCache:
+    """ Keeps the parsed data of each YAML source file on disk, so unchanged files don't have to be parsed again on the next start.
+        Each source file gets its own entry, keyed by its path, size, modification time, and content hash.
+        If the size and modification time match, the entry is used without reading the source file.
+        Otherwise the source file is hashed, and only parsed again if its content actually changed. """
+    
+    VERSION = 1
+    
+    def __init__(self, cachePath: str):
+        self.cachePath = cachePath
+        os.makedirs(self.cachePath, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+    
+    def getEntryPath(self, filename: str) -> str:
+        key = hashlib.sha1(os.path.abspath(filename).encode()).hexdigest()
+        return os.path.join(self.cachePath, key + ".pickle")
+    
+    def readEntry(self, filename: str) -> Optional[dict[str, Any]]:
+        try:
+            with open(self.getEntryPath(filename), "rb") as f:
+                entry = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+            return None
+        if not isinstance(entry, dict) or entry.get("version") != ContentCache.VERSION: return None
+        if entry.get("path") != os.path.abspath(filename): return None
+        return entry
+    
+    def writeEntry(self, filename: str, entry: dict[str, Any]):
+        entryPath = self.getEntryPath(filename)
+        # Each writer gets its own temporary file, since worker processes can write the same entry at once
+        fd, tempPath = tempfile.mkstemp(suffix=".tmp", dir=self.cachePath)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(entry, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tempPath, entryPath)
+        except BaseException:
+            if os.path.exists(tempPath):
+                os.remove(tempPath)
+            raise
+    
+    def get(self, filename: str) -> Optional[Any]:
+        """ Gets the cached data of a source file, or None if the file changed since it was cached. """
+        
+        stat = os.stat(filename)
+        entry = self.readEntry(filename)
+        if not entry:
+            self.misses += 1
+            return None
+        if entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime_ns:
+            self.hits += 1
+            return entry["data"]
+        
+        with open(filename, "rb") as f:
+            raw = f.read()
+        if entry["hash"] != hashlib.sha1(raw).hexdigest():
+            self.misses += 1
+            return None
+        # Touched but not changed, so only the stat needs updating
+        self.hits += 1
+        self.put(filename, entry["data"], raw)
+        return entry["data"]
+    
+    def put(self, filename: str, data: Any, raw: bytes=None):
+        """ Stores the parsed data of a source file. The data has to be plain (dicts, lists, strs, ints and the like).
+            The cache only saves time, so failing to write to it doesn't stop anything from loading. """
+        
+        try:
+            stat = os.stat(filename)
+            if raw == None:
+                with open(filename, "rb") as f:
+                    raw = f.read()
+            self.writeEntry(filename, {
+                "version": ContentCache.VERSION,
+                "path": os.path.abspath(filename),
+                "size": stat.st_size,
+                "mtime": stat.st_mtime_ns,
+                "hash": hashlib.sha1(raw).hexdigest(),
+                "data": data
+            })
+        except OSError:
+            pass
+
+def toPlain(obj: Any) -> Any:
+    """ Turns ruamel's round-trip types into the plain Python types they extend. """
+    if isinstance(obj, dict):
+        return {toPlain(key): toPlain(val) for key, val in obj.items()}
+    if isinstance(obj, list):
+        return [toPlain(val) for val in obj]
+    if isinstance(obj, bool) or obj == None:
+        return obj
+    if isinstance(obj, str):
+        return str(obj)
+    if isinstance(obj, int):
+        return int(obj)
+    if isinstance(obj, float):
+        return float(obj)
+    return obj
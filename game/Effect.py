@@ -4,6 +4,7 @@ from abc import abstractmethod
 
 from typing import Type
 
+from game.Alliance import Alliance
 from game.Character import Character, Tag
 from game.State import State
 from game.Valids import EventPart, Suite, Valids
@@ -78,7 +79,7 @@ class AllyEffect(Effect):
     def perform(self, char: Character, state: State):
         toAlly = state.getChar(self.charShort)
         if char.isAlone() and toAlly.isAlone():
-            alliance = []
+            alliance = Alliance()
             char.joinAlliance(alliance)
             toAlly.joinAlliance(alliance)
             return f"allied with: {toAlly}"
@@ -128,7 +129,7 @@ class MoveEffect(Effect):
         if self.zone:
             char.move(self.zone)
         else:
-            char.moveRandom()
+            char.moveRandom(state.rng)
         return f"moved to zone: {char.getLocation().name}"
 
 class KillEffect(Effect):
@@ -1,11 +1,15 @@
 
 from __future__ import annotations
-from random import choice
+from typing import Optional
 
 from game.Character import Character
 from game.Check import CheckSuite
 from game.Effect import EffectSuite
+from game.Population import Population
+from game.Runtime import Runtime
 from game.State import Result, State
+from game.Text import Text
+from game.Trace import EventLoad, trace
 from game.Valids import ValidationException, Valids
 
 RARITIES = {
@@ -23,13 +27,12 @@ class Event:
     def __init__(self, name: str, texts: list[str], checkNamesToArgLists: dict[str, list[list[str]]], effectNamesToArgLists: dict[str, list[list[str]]], sub: list[Event]):
         self.name = name
         self.texts = texts
+        # Parsed from the texts when the Event is loaded
+        self.templates: list[Text] = []
         self.checkSuites = [CheckSuite(checkName, checkNamesToArgLists[checkName]) for checkName in checkNamesToArgLists]
         self.effectSuites = [EffectSuite(effectName, effectNamesToArgLists[effectName]) for effectName in effectNamesToArgLists]
         self.sub = sub
         
-        self.triggerCts: dict[Character, int] = {}
-        self.state = State(self.triggerCts)
-        
         self.baseChance = 100
         if self.name.endswith("default"):
             self.baseChance = 0
@@ -43,14 +46,25 @@ class Event:
     def getName(self):
         return self.name
     
+    def copy(self) -> Event:
+        """ Gets an unloaded copy of this Event and its sub-events, built from the same arguments. """
+        copied = Event(
+            self.name,
+            self.texts,
+            {checkSuite.getCharShort(): checkSuite.argsLists for checkSuite in self.checkSuites},
+            {effectSuite.getCharShort(): effectSuite.argsLists for effectSuite in self.effectSuites},
+            [subEvent.copy() for subEvent in self.sub]
+        )
+        copied.baseChance = self.baseChance
+        return copied
+    
     def getChance(self):
-        if not self.state:
-            return self.baseChance
-        return self.state.chance
+        return self.baseChance
         
     def load(self, valids: Valids, isSub: bool=False):
         try:
-            print(self.name)
+            if trace.enabled:
+                trace.record(EventLoad(self.name))
             if self.checkSuites:
                 mainCheckSuite = self.checkSuites[0]
                 mainCheckSuite.load(valids, isSub)
@@ -64,43 +78,54 @@ class Event:
             for subEvent in self.sub:
                 subEvent.load(valids, True)
             
-            for text in self.texts:
-                valids.validateText(text)
+            self.templates = [Text(text) for text in self.texts]
+            for template in self.templates:
+                valids.validateText(template)
             
         except ValidationException as e:
             raise Exception(f"Encountered an exception when loading Event \"{self.name}\": {e}")
     
-    def prepare(self, mainChar: Character, otherChars: list[Character], state: State=None) -> bool:
+    def getTemplates(self) -> list[Text]:
+        """ Gets the parsed texts of this Event and all of its sub-events. """
+        templates = list(self.templates)
+        for subEvent in self.sub:
+            templates += subEvent.getTemplates()
+        return templates
+    
+    def prepare(self, mainChar: Character, otherChars: Population, runtime: Runtime, state: State=None) -> Optional[State]:
         """
-            Prepares this Event to be triggered, assigning Characters to the Event State if they match.
-            If any of the requirements aren't met, returns False, otherwise returns True.
+            Prepares this Event to be triggered, assigning Characters to a new Event State if they match.
+            Sub-events are given the State of the Event they follow, which the new State builds on.
+            If any of the requirements aren't met, returns None, otherwise returns the State to trigger the Event with.
             """
-        self.state = State(self.triggerCts, self.baseChance) if not state else state.sub(self.triggerCts, self.baseChance)
+        triggerCts = runtime.getTriggerCts(self)
+        newState = State(triggerCts, self.baseChance, runtime=runtime) if not state else state.sub(triggerCts, self.baseChance)
         
-        if not self.state.doesCharExist(mainChar):
-            return self.prepareBase(mainChar, otherChars)
+        if not newState.doesCharExist(mainChar):
+            matched = self.prepareBase(mainChar, otherChars, newState)
         else:
-            return self.prepareSub(otherChars)
+            matched = self.prepareSub(otherChars, newState)
+        return newState if matched else None
     
-    def prepareBase(self, mainChar: Character, otherChars: list[Character]):
+    def prepareBase(self, mainChar: Character, otherChars: Population, state: State):
         """ Prepares a base-level event. """
         # Main Character's requirements are always the first in the list of Suites
         mainCheckSuite = self.checkSuites[0]
         
         # Check the rest of the main's requirements
-        if not mainCheckSuite.checkAll(mainChar, self.state): return False
+        if not mainCheckSuite.check(mainChar, state): return False
         
         # If the main character matches, we put them into the State
-        self.state.setChar(mainCheckSuite.getCharShort(), mainChar)
+        state.setChar(mainCheckSuite.getCharShort(), mainChar)
         
         # All other requirement suites match other characters from the given list of all other Characters
         for reqSuite in self.checkSuites[1:]:
-            matchedChar = self.matchCharacter(reqSuite, otherChars)
+            matchedChar = self.matchCharacter(reqSuite, otherChars, state)
             if not matchedChar: return False
-            self.state.setChar(reqSuite.getCharShort(), matchedChar)
+            state.setChar(reqSuite.getCharShort(), matchedChar)
         return True
     
-    def prepareSub(self, otherChars: list[Character]):
+    def prepareSub(self, otherChars: Population, state: State):
         """ Prepares a sub-event. """
         # Sub-events can have empty requirements
         if not self.checkSuites: return True
@@ -108,52 +133,53 @@ class Event:
         for checkSuite in self.checkSuites:
             # There might already be a character in the Event State
             short = checkSuite.getCharShort()
-            matchedChar = self.state.getChar(short)
+            matchedChar = state.getChar(short)
             
             # If that's not the case, we want to match a new Character like normal
             if not matchedChar:
-                matchedChar = self.matchCharacter(checkSuite, otherChars)
+                matchedChar = self.matchCharacter(checkSuite, otherChars, state)
                 if not matchedChar: return False
-                self.state.setChar(checkSuite.getCharShort(), matchedChar)
+                state.setChar(checkSuite.getCharShort(), matchedChar)
                 continue
             # If that is the case, we want to check the preexisting Character against the new requirements
-            if not checkSuite.checkAll(matchedChar, self.state):
+            if not checkSuite.check(matchedChar, state):
                 return False
         
         return True
     
-    def matchCharacter(self, checkSuite: CheckSuite, otherChars: dict[str, Character]):
+    def matchCharacter(self, checkSuite: CheckSuite, otherChars: Population, state: State):
         # Collect a list of all matched Characters
         matchedChars: list[Character] = []
         
-        for char in otherChars.values():
+        # Only the smallest index the Suite's static requirements allow has to be checked
+        for char in otherChars.getCandidates(checkSuite, state):
             # Can't match the same Character twice
-            if self.state.doesCharExist(char): continue
+            if state.doesCharExist(char): continue
             # Full Suite check, adding Character if it matches
-            if checkSuite.checkAll(char, self.state):
+            if checkSuite.check(char, state):
                 matchedChars.append(char)
         if not matchedChars:
             return False
         
         # Assign a random Character from the matched Characters to the State
-        return choice(matchedChars)
+        return state.rng.choice(matchedChars)
     
-    def incrementTriggers(self, char: Character):
-        """ Increments the number of times this Event has been triggered by a certain Character. """
-        # Count the number of triggers that have happened to the main Character
-        if not char in self.triggerCts:
-            self.triggerCts[char] = 0
-        self.triggerCts[char] += 1
+    def getAllEvents(self) -> list[Event]:
+        """ Gets this Event and all of its sub-events. """
+        events = [self]
+        for subEvent in self.sub:
+            events += subEvent.getAllEvents()
+        return events
     
-    def trigger(self, result: Result):
+    def trigger(self, result: Result, state: State):
         """ Performs the Event's effects on the Characters given to the State. """
-        mc = self.state.getChar()
-        self.incrementTriggers(mc)
+        mc = state.getChar()
+        state.incrementTriggers(mc)
         
-        result.addText(choice(self.texts), self.state)
+        result.addText(state.rng.choice(self.templates), state)
         # Do each Suite's actions to the State's Characters
         for effectSuite in self.effectSuites:
-            char = self.state.getChar(effectSuite.getCharShort())
-            for effectText in effectSuite.performAll(char, self.state):
+            char = state.getChar(effectSuite.getCharShort())
+            for effectText in effectSuite.performAll(char, state):
                 result.addEffect(char, effectText)
-        return self.state, self.sub
+        return state, self.sub
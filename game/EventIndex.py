@@ -0,0 +1,74 @@
+from __future__ import annotations
+from heapq import merge
+from typing import Iterable, Optional
+
+from game.Character import Character
+from game.Check import AliveCheck, LocationCheck, RoundCheck, StatusCheck, TagCheck
+from game.Event import Event
+
+class EventIndex:
+    """ Buckets loaded base Events by the static requirements of their main Character,
+        so that only the Events a Character could plausibly match have to be prepared.
+        Built once the Events have been loaded, since it reads their loaded Check Suites. """
+    
+    def __init__(self, events: Iterable[Event]):
+        self.events = list(events)
+        # (alive, status name, zone name, round) -> positions of Events in self.events
+        # A None zone or round means the Event doesn't restrict it
+        self.buckets: dict[tuple[bool, Optional[str], Optional[str], Optional[int]], list[int]] = {}
+        # Events without any Check Suites can't be bucketed
+        self.unindexed: list[int] = []
+        # Tags the main Character is required to have, per Event position
+        self.requiredTags: dict[int, list[str]] = {}
+        
+        for pos, event in enumerate(self.events):
+            if not event.checkSuites:
+                self.unindexed.append(pos)
+                continue
+            key, tags = EventIndex.getStaticRequirements(event)
+            self.buckets.setdefault(key, []).append(pos)
+            if tags:
+                self.requiredTags[pos] = tags
+    
+    @staticmethod
+    def getStaticRequirements(event: Event) -> tuple[tuple[bool, Optional[str], Optional[str], Optional[int]], list[str]]:
+        """ Reads the bucket key and the required tags from an Event's main Check Suite. """
+        alive = True
+        status = None
+        zone = None
+        round = None
+        tags: list[str] = []
+        for check in event.checkSuites[0].checks:
+            if type(check) == AliveCheck:
+                alive = check.aState == AliveCheck.ALIVE
+            elif type(check) == StatusCheck and status == None:
+                status = check.status
+            elif type(check) == LocationCheck and zone == None:
+                zone = check.locName
+            elif type(check) == RoundCheck and check.comp == "=" and round == None:
+                round = check.number
+            elif type(check) == TagCheck and not check.flip:
+                tags.append(check.tag)
+        return (alive, status, zone, round), tags
+    
+    def getCandidates(self, char: Character) -> list[Event]:
+        """ Gets the Events whose static requirements the Character meets, in their loaded order. """
+        alive = char.isAlive()
+        status = char.status.name if char.status else None
+        zones = [None] if not char.location else [None, char.location.name]
+        
+        lists = [self.unindexed] if self.unindexed else []
+        for zone in zones:
+            for round in (None, char.getAge()):
+                bucket = self.buckets.get((alive, status, zone, round))
+                if bucket: lists.append(bucket)
+        
+        if not lists: return []
+        positions = lists[0] if len(lists) == 1 else merge(*lists)
+        candidates: list[Event] = []
+        for pos in positions:
+            tags = self.requiredTags.get(pos)
+            if tags and not all(char.hasTag(tag) for tag in tags):
+                continue
+            candidates.append(self.events[pos])
+        return candidates
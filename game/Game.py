@@ -1,31 +1,51 @@
 
-from random import choice, randint
+import random
+from random import Random
 from typing import Optional, Union
 
 from game.Character import Character
 from game.Event import Event
+from game.EventIndex import EventIndex
 from game.Item import Item, Item
 from game.Map import Map
+from game.Population import Population
+from game.Rng import RecordingRandom, dumpState, loadState
+from game.Runtime import Runtime
 from game.State import Result, State
+from game.Trace import EventChoice, trace
+from game.Trove import Trove, TroveTable
 
 
 class Game:
-    def __init__(self, items: dict[str, Item], events: dict[str, Event], tributes: dict[str, Character], map: Map):
-        self.tributes = tributes
+    """ One game being played.
+        The Items, Events and Map are shared with every other Game loaded with them, and aren't changed while playing.
+        The tributes are copies belonging to this Game, and everything else that changes is kept in its Runtime. """
+    
+    def __init__(self, items: dict[str, Item], events: dict[str, Event], tributes: dict[str, Character], map: Map, eventIndex: EventIndex=None, troveTables: dict[Trove, TroveTable]=None):
+        self.tributes = {name: tribute.copy() for name, tribute in tributes.items()}
         self.items = items
         self.events = events
         self.map = map
+        self.eventIndex = eventIndex if eventIndex else EventIndex(self.events.values())
+        self.troveTables = troveTables if troveTables != None else {trove: TroveTable(trove, self.items) for trove in self.map.troves.values()}
+        self.population = Population(self.tributes.values())
         
         self.sortedTributes = [(name, self.tributes[name]) for name in sorted(self.tributes.keys())]
-        self.sortedItems = [(name, self.items[name]) for name in sorted(self.items.keys())]
-        self.sortedEvents = [(name, self.events[name]) for name in sorted(self.events.keys())]
-        self.sortedZones = self.map.getSortedZones()
         
         self.inProgress = False
         self.rounds = 0
         
+        # Every random decision in the game is drawn from the Runtime's stream, which is seeded when the game starts
+        self.seed: Optional[int] = None
+        self.runtime = Runtime(troveTables=self.troveTables)
+        
         self.acted: list[Character] = []
         self.toAct: list[Character] = []
+        
+        # What changed since the last checkpoint, so that checkpoints of just the changes don't have to go over everything
+        self.changedTributes: dict[Character, None] = {}
+        self.changedEvents: dict[Event, None] = {}
+        self.checkpointedLog = 0
     
     def getTributeByName(self, name: str):
         return self.tributes.get(name)
@@ -43,13 +63,13 @@ class Game:
         return self.sortedTributes
     
     def getSortedItems(self):
-        return self.sortedItems
+        return [(name, self.items[name]) for name in sorted(self.items.keys())]
     
     def getSortedEvents(self):
-        return self.sortedEvents
+        return [(name, self.events[name]) for name in sorted(self.events.keys())]
     
     def getSortedZones(self):
-        return self.sortedZones
+        return self.map.getSortedZones()
     
     def getRoundFlavor(self):
         if self.rounds == 0:
@@ -64,79 +84,191 @@ class Game:
         event = self.getEventByName(eventName)
         if not event: return f"unable to find event named {eventName}"
         
-        if event.prepare(char, self.tributes):
-            return self.trigger(char, event)
+        state = event.prepare(char, self.population, self.runtime)
+        if state:
+            return self.trigger(char, event, state)
         
         return "Trigger failed"
     
-    def trigger(self, char: Character, event: Event, results: Optional[Result]=None) -> Optional[Result]:
+    def trigger(self, char: Character, event: Event, state: State, results: Optional[Result]=None) -> Optional[Result]:
         if not results:
             results = Result(char)
-        state, subEvents = event.trigger(results)
+        state, subEvents = event.trigger(results, state)
+        # Effects only change the Characters in the State
+        self.changedEvents[event] = None
+        for tribute in state.charsPool.values():
+            self.changedTributes[tribute] = None
         if subEvents:
-            sub = self.chooseFromEvents(char, subEvents, state)
-            if not sub: return results
-            self.trigger(char, sub, results)
+            chosen = self.chooseFromEvents(char, subEvents, state)
+            if not chosen: return results
+            sub, subState = chosen
+            self.trigger(char, sub, subState, results)
         return results
         
-    def chooseFromEvents(self, char: Character, events: list[Event]=None, state: State=None) -> Optional[Event]:
+    def chooseFromEvents(self, char: Character, events: list[Event]=None, state: State=None) -> Optional[tuple[Event, State]]:
+        """ Picks an Event for the Character at random, weighted by the chances of the Events they matched.
+            Returns the Event with the State it was prepared with. """
         if not events:
-            events = self.events.values()
+            events = self.eventIndex.getCandidates(char)
         
-        possibleEvents: list[Event] = []
+        possibleEvents: list[tuple[Event, State]] = []
         totalChance = 0
-        defaultEvent: Optional[Event] = None
+        defaultEvent: Optional[tuple[Event, State]] = None
         
         for event in events:
-            if event.prepare(char, self.tributes, state):
-                if event.getChance() == 0:
-                    defaultEvent = event
+            eventState = event.prepare(char, self.population, self.runtime, state)
+            if eventState:
+                if eventState.chance == 0:
+                    defaultEvent = (event, eventState)
                     continue
-                totalChance += event.getChance()
-                possibleEvents.append(event)
-        
-        print(f"Character: {char}")
-        print(f"  alive:\t{char.alive}")
-        print(f"  age:\t{char.age}")
-        print(f"  location:\t{char.location}")
-        print(f"  status:\t{char.status}")
-        print(f"  tags:")
-        [print(f"    {tag}") for tag in char.tags]
-        print(f"  inventory:\t{char.items}")
-        print(f"  alliance:\t{char.alliance}")
-        print(f"Possible events: {possibleEvents}")
-        print(f"Default event: {defaultEvent}\n")
+                totalChance += eventState.chance
+                possibleEvents.append((event, eventState))
+        
+        if trace.enabled:
+            trace.record(EventChoice(
+                char.name,
+                char.alive,
+                char.age,
+                char.location.name if char.location else None,
+                char.status.name if char.status else None,
+                tuple(str(tag) for tag in char.tags.values()),
+                tuple(item.name for item in char.items),
+                char.alliance.getId() if char.alliance else None,
+                tuple(event.name for event, _ in possibleEvents),
+                defaultEvent[0].name if defaultEvent else None
+            ))
         
         if not possibleEvents:
             if defaultEvent:
                 return defaultEvent
-            else:
-                raise Exception("No events matched when choosing from events")
+            if not char.isAlive():
+                return None
+            raise Exception("No events matched when choosing from events")
                 
-        choice = randint(0, totalChance - 1)
+        choice = self.runtime.rng.randint(0, totalChance - 1)
         
         count = 0
-        for event in possibleEvents:
-            if choice >= count and choice < (count + event.getChance()):
-                return event
-            count = count + event.getChance()
+        for event, eventState in possibleEvents:
+            if choice >= count and choice < (count + eventState.chance):
+                return event, eventState
+            count = count + eventState.chance
         if not char.isAlive():
             return None
         raise Exception(f"Invalid choice when choosing from events ({choice} out of {totalChance})")
     
-    def start(self):
-        """ Starts the game, resetting all tributes and troves. """
+    def start(self, seed: Optional[int]=None, record: bool=False, rng: Optional[Random]=None):
+        """ Starts the game, resetting all tributes, troves, and event trigger counts.
+            The game's random stream is seeded with `seed`, or a random seed if none is given, so the same seed plays the same game.
+            If `record` is set, every random decision is logged, see `getChoiceLog`.
+            A stream can also be given directly, such as a ReplayRandom to play a logged game again. """
         
         if self.inProgress: return False
         self.inProgress = True
+        if rng:
+            self.seed = None
+        else:
+            self.seed = seed if seed != None else random.randrange(2**32)
+            rng = RecordingRandom(self.seed) if record else Random(self.seed)
+        self.runtime = Runtime(rng, self.troveTables)
+        
         for tribute in self.tributes.values():
             tribute.reset()
+        self.population = Population(self.tributes.values())
+        for tribute in self.tributes.values():
             tribute.move(self.map.getStartingZone())
-        for trove in self.map.troves.values():
-            trove.reset()
-            trove.load(self.items)
+        for trove, table in self.troveTables.items():
+            self.runtime.troveGens[trove] = table.generate(rng)
+        self.markCheckpointed()
         return True
     
+    def getTriggerCounts(self) -> dict[str, int]:
+        """ Gets the total number of triggers of each Event and sub-event in this Game, keyed by Event name. """
+        counts = {}
+        for event in self.events.values():
+            for subEvent in event.getAllEvents():
+                counts[subEvent.name] = sum(self.runtime.triggerCts.get(subEvent, {}).values())
+        return counts
+    
+    def getCheckpoint(self, changesOnly: bool=False) -> dict:
+        """ Gets the progress of the Game as plain data, with game objects referenced by name.
+            Restoring it with `restoreCheckpoint` on a Game loaded with the same content continues the Game where it was.
+            
+            If `changesOnly` is set, only the tributes and Events changed since the last checkpoint are included, and only the new part of the choice log,
+            for a Checkpointer to append to the last one. Either way, everything counts as checkpointed afterwards. """
+        
+        tributes = self.changedTributes if changesOnly else self.tributes.values()
+        events = self.changedEvents if changesOnly else self.runtime.triggerCts
+        triggers = {}
+        for event in events:
+            triggerCts = self.runtime.triggerCts.get(event)
+            if triggerCts:
+                # Sub-events count their triggers under None, since their State has no main Character
+                triggers[event.name] = {char.name if char else None: count for char, count in triggerCts.items()}
+        
+        rng = self.runtime.rng
+        log = rng.log if isinstance(rng, RecordingRandom) else None
+        checkpoint = {
+            "inProgress": self.inProgress,
+            "rounds": self.rounds,
+            "toAct": [tribute.name for tribute in self.toAct],
+            "seed": self.seed,
+            "rng": dumpState(rng),
+            "log": log[self.checkpointedLog if changesOnly else 0:].tobytes() if log != None else None,
+            "tributes": {tribute.name: tribute.getCheckpoint() for tribute in tributes},
+            "troves": {trove.name: table.getCheckpoint(self.runtime.getTroveGen(trove)) for trove, table in self.troveTables.items()},
+            "triggers": triggers
+        }
+        self.markCheckpointed()
+        return checkpoint
+    
+    def markCheckpointed(self):
+        self.changedTributes = {}
+        self.changedEvents = {}
+        rng = self.runtime.rng
+        self.checkpointedLog = len(rng.log) if isinstance(rng, RecordingRandom) else 0
+    
+    def giveItem(self, tribute: Character, item: Item):
+        """ Gives a copy of an Item to a tribute from outside of an Event, such as a command. """
+        tribute.copyAndGiveItem(item)
+        self.changedTributes[tribute] = None
+    
+    def restoreCheckpoint(self, data: dict):
+        """ Continues a Game from a checkpoint made by `getCheckpoint`. """
+        
+        for name in data["tributes"]:
+            if not name in self.tributes: raise Exception(f"Couldn't find the checkpointed tribute \"{name}\"")
+        
+        alliances = {}
+        for name, tribute in self.tributes.items():
+            if name in data["tributes"]:
+                tribute.restoreCheckpoint(data["tributes"][name], self.map, self.items, alliances)
+            else:
+                tribute.reset()
+        self.population = Population(self.tributes.values())
+        
+        self.seed = data["seed"]
+        if data["log"] != None:
+            rng = RecordingRandom(self.seed)
+            rng.log.frombytes(data["log"])
+        else:
+            rng = Random()
+        loadState(rng, data["rng"])
+        self.runtime = Runtime(rng, self.troveTables)
+        
+        for trove, table in self.troveTables.items():
+            self.runtime.troveGens[trove] = table.restoreCheckpoint(data["troves"].get(trove.name, []))
+        
+        for event in self.events.values():
+            for subEvent in event.getAllEvents():
+                for charName, count in data["triggers"].get(subEvent.name, {}).items():
+                    self.runtime.getTriggerCts(subEvent)[self.tributes[charName] if charName != None else None] = count
+        
+        self.inProgress = data["inProgress"]
+        self.rounds = data["rounds"]
+        self.acted = []
+        self.toAct = [self.tributes[name] for name in data["toAct"]]
+        self.markCheckpointed()
+    
     def round(self) -> Optional[bool]:
         """ Starts a game round. Increments the age of all tributes. """
         if self.toAct: return True
@@ -157,13 +289,29 @@ class Game:
         
         if not self.toAct: self.round()
         
-        acting = choice(self.toAct)
+        acting = self.runtime.rng.choice(self.toAct)
         self.toAct.remove(acting)
-        event = self.chooseFromEvents(acting)
-        if not event: return None
-        result = self.trigger(acting, event)
+        chosen = self.chooseFromEvents(acting)
+        if not chosen: return None
+        event, state = chosen
+        result = self.trigger(acting, event, state)
         return result
     
+    def getSeed(self) -> Optional[int]:
+        return self.seed
+    
+    def getChoiceLog(self) -> Optional[bytes]:
+        """ Gets the compressed log of every random decision made so far, if the game was started with `record` set. """
+        if not isinstance(self.runtime.rng, RecordingRandom): return None
+        return self.runtime.rng.getLog()
+    
     def isRoundGoing(self) -> bool:
         return len(self.toAct) > 0
+    
+    def getAliveTributes(self) -> list[Character]:
+        return [tribute for tribute in self.tributes.values() if tribute.isAlive()]
+    
+    def isOver(self) -> bool:
+        """ The game is over once at most one tribute is left alive. """
+        return self.inProgress and len(self.getAliveTributes()) <= 1
         
@@ -0,0 +1,51 @@
+from __future__ import annotations
+from typing import Callable, Iterable
+
+import inflect
+p = inflect.engine()
+
+class Memo:
+    """ A bounded, process-wide cache for a slow pure function of one string.
+        Once full, the oldest entry is dropped to make room for a new one. """
+    
+    def __init__(self, fun: Callable[[str], str], maxSize: int=4096):
+        self.fun = fun
+        self.maxSize = maxSize
+        self.cache: dict[str, str] = {}
+        self.hits = 0
+        self.misses = 0
+    
+    def __call__(self, key: str) -> str:
+        val = self.cache.get(key)
+        if val != None:
+            self.hits += 1
+            return val
+        self.misses += 1
+        val = self.fun(key)
+        if len(self.cache) >= self.maxSize:
+            del self.cache[next(iter(self.cache))]
+        self.cache[key] = val
+        return val
+    
+    def getStats(self) -> dict[str, int]:
+        return {"size": len(self.cache), "hits": self.hits, "misses": self.misses}
+    
+    def clear(self):
+        self.cache.clear()
+        self.hits = 0
+        self.misses = 0
+
+# Conjugates a verb for a singular Character, such as run -> runs
+conjugate = Memo(p.plural)
+# Gets the name with its indefinite article, such as apple -> an apple
+article = Memo(p.a)
+
+def prewarm(verbs: Iterable[str], names: Iterable[str]):
+    """ Fills the caches ahead of time so rendering Event texts doesn't have to call inflect. """
+    for verb in verbs:
+        conjugate(verb)
+    for name in names:
+        article(name)
+
+def getStats() -> dict[str, dict[str, int]]:
+    return {"conjugate": conjugate.getStats(), "article": article.getStats()}
@@ -1,12 +1,41 @@
 
 from __future__ import annotations
-import inflect
-p = inflect.engine()
+from typing import Optional
+
+from game.Inflection import article
+
+# Every Item tag seen in the process, interned to a bit position
+tagBits: dict[str, int] = {}
+
+def internTag(tag: str) -> int:
+    """ Gets the bit for an Item tag, giving it the next free bit if it hasn't been seen before. """
+    bit = tagBits.get(tag)
+    if bit == None:
+        bit = 1 << len(tagBits)
+        tagBits[tag] = bit
+    return bit
+
+def getTagsMask(tags: list[str]) -> int:
+    mask = 0
+    for tag in tags:
+        mask |= internTag(tag)
+    return mask
+
+def compileTags(tags: list[str]) -> Optional[int]:
+    """ Compiles a list of required Item tags into a mask for Item.hasTagMask.
+        Lists containing ANY compile to None, which matches every Item. """
+    if "ANY" in tags: return None
+    return getTagsMask(tags)
+
+SECRETBIT = internTag("SECRET")
 
 class Item:
     def __init__(self, name: str, tags: list[str]):
         self.name = name
         self.tags = tags
+        self.mask = getTagsMask(tags)
+        # Secret Items are only matched by SECRET
+        self.secret = bool(self.mask & SECRETBIT)
     
     def __repr__(self):
         return f"Item \"{self.name}\""
@@ -22,7 +51,7 @@ class Item:
         if tag:
             lcTag = tag.lower()
             if lcTag == "a":
-                toRet = p.a(self.name)
+                toRet = article(self.name)
             elif tag:
                 return None
         return toRet
@@ -35,8 +64,14 @@ class Item:
         return tag in self.tags
     
     def hasAllTags(self, tags: list[str]) -> bool:
-        if "ANY" in tags: return True
-        return all([self.hasTag(tag) for tag in tags])
+        return self.hasTagMask(compileTags(tags))
+    
+    def hasTagMask(self, mask: Optional[int]) -> bool:
+        """ Gets whether this Item has every tag in a mask from compileTags. """
+        if mask == None: return True
+        if self.secret:
+            return mask & ~SECRETBIT == 0
+        return self.mask & mask == mask
     
     def copy(self) -> Item:
         return Item(self.name, self.tags)
@@ -3,7 +3,8 @@ from __future__ import annotations
 from typing import Union
 from game.Item import Item
 from game.Trove import Trove
-from random import choice
+import random
+from random import Random
 
 class Zone:
     def __init__(self, name: str):
@@ -17,9 +18,9 @@ class Zone:
         if zone in self.connections: return
         self.connections.append(zone)
     
-    def getRandomConnection(self):
+    def getRandomConnection(self, rng: Random=None):
         if not self.connections: return self
-        return choice(self.connections)
+        return (rng or random).choice(self.connections)
     
     def getConnectionStr(self):
         if not self.connections: return "No connections"
@@ -49,11 +50,6 @@ class Map:
     def getTrove(self, name: str):
         return self.troves.get(name)
     
-    def loadTroves(self, loadedItems: dict[str, Item]):
-        for trove in self.troves.values():
-            res = trove.load(loadedItems)
-            if res: return res
-    
     def connectZone(self, name: str, connx: str):
         zone = self.getZone(name)
         for conn in connx:
@@ -0,0 +1,67 @@
+from __future__ import annotations
+from bisect import bisect_left, insort
+from typing import Any, Callable, Optional
+
+class PackIndex:
+    """ The dotted names of one kind of content file, mapped to their paths.
+        Names are kept sorted so that every name starting with a prefix can be found with a binary search. """
+    
+    def __init__(self):
+        self.paths: dict[str, str] = {}
+        self.names: list[str] = []
+    
+    def __contains__(self, dotsName: str) -> bool:
+        return dotsName in self.paths
+    
+    def __iter__(self):
+        return iter(self.names)
+    
+    def add(self, dotsName: str, path: str):
+        if not dotsName in self.paths:
+            insort(self.names, dotsName)
+        self.paths[dotsName] = path
+    
+    def getPath(self, dotsName: str) -> Optional[str]:
+        return self.paths.get(dotsName)
+    
+    def matchPrefix(self, prefix: str) -> list[str]:
+        """ Gets every dotted name starting with the prefix, in sorted order. """
+        matched = []
+        for pos in range(bisect_left(self.names, prefix), len(self.names)):
+            name = self.names[pos]
+            if not name.startswith(prefix): break
+            matched.append(name)
+        return matched
+
+class ContentKind:
+    """ One kind of content (characters, items, maps, or events): where its files are, how to build them, and the packs built so far. """
+    
+    def __init__(self, name: str, dirName: str, buildFun: Callable[[str, Any], None], objsPerFile: dict[str, Any], allObjs: Optional[dict[str, Any]]=None):
+        self.name = name
+        self.dirName = dirName
+        # Called with a file's dotted name and parsed data, adds the built pack to objsPerFile
+        self.buildFun = buildFun
+        # Dotted name -> built pack
+        self.objsPerFile = objsPerFile
+        # Object name -> object across every built pack, for kinds which check for duplicates
+        self.allObjs = allObjs
+        self.files = PackIndex()
+        # Dotted name -> (size, modification time) of the file when its pack was built
+        self.signatures: dict[str, tuple[int, int]] = {}
+        # Dotted name -> number of times the pack has been rebuilt or removed
+        self.generations: dict[str, int] = {}
+    
+    def isBuilt(self, dotsName: str) -> bool:
+        return dotsName in self.objsPerFile
+    
+    def getGeneration(self, dotsName: str) -> int:
+        return self.generations.get(dotsName, 0)
+    
+    def unbuild(self, dotsName: str):
+        """ Forgets a built pack and its objects, so that it can be built again. """
+        pack = self.objsPerFile.pop(dotsName, None)
+        self.signatures.pop(dotsName, None)
+        self.generations[dotsName] = self.getGeneration(dotsName) + 1
+        if self.allObjs != None and isinstance(pack, dict):
+            for name in pack:
+                self.allObjs.pop(name, None)
@@ -0,0 +1,96 @@
+from __future__ import annotations
+from typing import Iterable, Optional
+
+from game.Character import Character
+from game.Check import CheckSuite
+from game.Map import Zone
+from game.State import State
+
+class Population:
+    """ Live indexes of a Game's tributes by zone, life and alliance.
+        Each tribute keeps its Population up to date as it moves, dies, revives, and joins or leaves alliances.
+        Dicts are used as ordered sets so that iterating them doesn't depend on hashing. """
+    
+    def __init__(self, tributes: Iterable[Character]):
+        self.all: dict[Character, None] = {}
+        self.byZone: dict[str, dict[Character, None]] = {}
+        self.alive: dict[Character, None] = {}
+        self.dead: dict[Character, None] = {}
+        self.alone: dict[Character, None] = {}
+        self.allied: dict[Character, None] = {}
+        # Increased whenever a tribute dies or is revived, so anything showing who's alive knows to update
+        self.lifeChanges = 0
+        
+        for tribute in tributes:
+            self.all[tribute] = None
+            if tribute.location:
+                self.byZone.setdefault(tribute.location.name, {})[tribute] = None
+            (self.alive if tribute.isAlive() else self.dead)[tribute] = None
+            (self.alone if tribute.isAlone() else self.allied)[tribute] = None
+            tribute.population = self
+    
+    def __len__(self):
+        return len(self.all)
+    
+    def values(self):
+        return self.all.keys()
+    
+    #
+    # Updates, called by Character
+    #
+    
+    def moved(self, char: Character, old: Optional[Zone], new: Optional[Zone]):
+        if old:
+            self.byZone[old.name].pop(char, None)
+        if new:
+            self.byZone.setdefault(new.name, {})[char] = None
+    
+    def died(self, char: Character):
+        self.alive.pop(char, None)
+        self.dead[char] = None
+        self.lifeChanges += 1
+    
+    def revived(self, char: Character):
+        self.dead.pop(char, None)
+        self.alive[char] = None
+        self.lifeChanges += 1
+    
+    def joined(self, char: Character):
+        self.alone.pop(char, None)
+        self.allied[char] = None
+    
+    def left(self, char: Character):
+        self.allied.pop(char, None)
+        self.alone[char] = None
+    
+    #
+    # Queries
+    #
+    
+    def getInZone(self, zoneName: str) -> dict[Character, None]:
+        return self.byZone.get(zoneName, {})
+    
+    def getCandidates(self, checkSuite: CheckSuite, state: State) -> Iterable[Character]:
+        """ Gets the smallest index that every Character matching the Check Suite has to be in.
+            The Suite still has to be checked against each candidate. """
+        indexes = [self.all]
+        if checkSuite.requiresAlive == True:
+            indexes.append(self.alive)
+        elif checkSuite.requiresAlive == False:
+            indexes.append(self.dead)
+        if checkSuite.requiresAlone == True:
+            indexes.append(self.alone)
+        elif checkSuite.requiresAlone == False:
+            indexes.append(self.allied)
+        if checkSuite.zoneName:
+            indexes.append(self.getInZone(checkSuite.zoneName))
+        if checkSuite.requiresNearby:
+            target = state.getChar(checkSuite.nearbyShort)
+            if target and target.getLocation():
+                indexes.append(self.getInZone(target.getLocation().name))
+        if checkSuite.allyShort:
+            target = state.getChar(checkSuite.allyShort)
+            if target:
+                alliance = target.getAlliance()
+                indexes.append(alliance.members if alliance else {})
+        return min(indexes, key=len)
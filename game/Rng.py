@@ -0,0 +1,64 @@
+from __future__ import annotations
+from array import array
+from random import Random
+import zlib
+
+class RecordingRandom(Random):
+    """ A seeded random stream which logs every decision it makes.
+        Every draw the game makes (`choice`, `randint` and `randrange`) comes down to picking a number below some bound,
+        so the log only needs those numbers to drive the same game again with a ReplayRandom. """
+    
+    def __init__(self, seed: int):
+        super().__init__(seed)
+        self.log = array("I")
+    
+    def _randbelow(self, n: int) -> int:
+        val = super()._randbelow(n)
+        self.log.append(val)
+        return val
+    
+    def getLog(self) -> bytes:
+        return dumpLog(self.log)
+
+class ReplayRandom(Random):
+    """ Makes the decisions of a recorded log in order, instead of drawing them. """
+    
+    def __init__(self, log: bytes):
+        super().__init__(0)
+        self.log = loadLog(log)
+        self.pos = 0
+    
+    def _randbelow(self, n: int) -> int:
+        if self.pos >= len(self.log):
+            raise ReplayException(f"The log ran out after {self.pos} decisions")
+        val = self.log[self.pos]
+        if val >= n:
+            raise ReplayException(f"Decision {self.pos} was {val}, but only {n} options were given, so the game went differently than when it was recorded")
+        self.pos += 1
+        return val
+    
+    def isFinished(self) -> bool:
+        return self.pos >= len(self.log)
+
+class ReplayException(Exception):
+    """ Raised when a replayed game stops matching its log. """
+    pass
+
+def dumpLog(log: array) -> bytes:
+    return zlib.compress(log.tobytes())
+
+def loadLog(data: bytes) -> array:
+    log = array("I")
+    log.frombytes(zlib.decompress(data))
+    return log
+
+def dumpState(rng: Random) -> tuple:
+    """ Gets the state of a random stream with its words packed into bytes, which is much quicker to store than the tuple of ints `getstate` gives. """
+    version, internal, gauss = rng.getstate()
+    return version, array("I", internal).tobytes(), gauss
+
+def loadState(rng: Random, state: tuple):
+    version, internal, gauss = state
+    words = array("I")
+    words.frombytes(internal)
+    rng.setstate((version, tuple(words), gauss))
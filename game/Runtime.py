@@ -0,0 +1,39 @@
+from __future__ import annotations
+from random import Random
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from game.Character import Character
+    from game.Event import Event
+    from game.Trove import Trove, TroveTable
+
+class Runtime:
+    """ The changing state of one Game that isn't kept on its tributes: event trigger counts, trove contents, and the random stream.
+        Events, Troves, the Map and Items are shared between every Game loaded with them and never change while playing,
+        so each Game keeps its own Runtime, and hands it to Events through their State. """
+    
+    def __init__(self, rng: Random=None, troveTables: dict[Trove, TroveTable]=None):
+        self.rng = rng or Random()
+        # Trove -> its table for the Game's Items. Shared with other Games loaded with the same Items, so never changed
+        self.troveTables = troveTables if troveTables != None else {}
+        # Event -> Character -> number of times the Event triggered with them as the main Character
+        self.triggerCts: dict[Event, dict[Character, int]] = {}
+        # Trove -> indices into its table of the Items which have been generated and not looted yet
+        self.troveGens: dict[Trove, list[int]] = {}
+    
+    def getTriggerCts(self, event: Event) -> dict[Character, int]:
+        triggerCts = self.triggerCts.get(event)
+        if triggerCts == None:
+            triggerCts = {}
+            self.triggerCts[event] = triggerCts
+        return triggerCts
+    
+    def getTroveTable(self, trove: Trove) -> TroveTable:
+        return self.troveTables[trove]
+    
+    def getTroveGen(self, trove: Trove) -> list[int]:
+        gen = self.troveGens.get(trove)
+        if gen == None:
+            gen = []
+            self.troveGens[trove] = gen
+        return gen
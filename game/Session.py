@@ -0,0 +1,219 @@
+from __future__ import annotations
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+from typing import Any, Awaitable, Callable, Hashable, Optional, Union
+
+from game.All import All
+from game.Checkpoint import Checkpointer
+from game.Game import Game
+from game.State import Result
+
+class Session:
+    """ A Game being played in one place, such as a channel, with the settings it was loaded with.
+        Its progress is checkpointed to its own file so it can be continued after a restart.
+        
+        Playing runs in the manager's executor so it never blocks the event loop, and the Session's lock makes sure only one thing uses the Game at a time.
+        The async methods take the lock themselves. The others don't, and are what the async ones run in the executor. """
+    
+    def __init__(self, key: Hashable, manager: SessionManager):
+        self.key = key
+        self.manager = manager
+        self.settings = dict(manager.defaultSettings)
+        self.checkpointer = Checkpointer(manager.getCheckpointPath(key), self.settings)
+        self.game: Optional[Game] = None
+        self.lock = asyncio.Lock()
+        # Increased whenever a new Game is loaded, so anything still working on the old one knows to stop
+        self.generation = 0
+    
+    async def run(self, fun: Callable, *args: Any) -> Any:
+        """ Runs a function using the Game in the executor, waiting for anything else using it to finish first. """
+        async with self.lock:
+            return await self.manager.runLocked(fun, *args)
+    
+    #
+    # Loading
+    #
+    
+    def newGame(self, characters: list[str]=None, items: list[str]=None, map: str=None, events: list[str]=None) -> Game:
+        """ Loads a new Game, using the given settings in place of the current ones. The old Game's checkpoint is removed. """
+        settings = {
+            "characters": characters if characters != None else self.settings["characters"],
+            "items": items if items != None else self.settings["items"],
+            "map": map if map != None else self.settings["map"],
+            "events": events if events != None else self.settings["events"]
+        }
+        with self.manager.contentLock:
+            self.game = self.manager.all.loadGameWithSettings(settings["characters"], settings["items"], settings["map"], settings["events"])
+        self.generation += 1
+        self.settings = settings
+        self.checkpointer.clear()
+        self.checkpointer.meta = self.settings
+        return self.game
+    
+    async def load(self, characters: list[str]=None, items: list[str]=None, map: str=None, events: list[str]=None) -> Game:
+        return await self.run(self.newGame, characters, items, map, events)
+    
+    async def ensureGame(self) -> Game:
+        """ Loads a Game with the current settings if the Session doesn't have one yet. """
+        async with self.lock:
+            if self.game == None:
+                await self.manager.runLocked(self.newGame)
+            return self.game
+    
+    def restore(self) -> bool:
+        """ Continues the checkpointed Game, if there is one. Returns whether there was. """
+        loaded = Checkpointer.load(self.checkpointer.path)
+        if not loaded: return False
+        settings, checkpoint = loaded
+        with self.manager.contentLock:
+            game = self.manager.all.loadGameWithSettings(settings["characters"], settings["items"], settings["map"], settings["events"])
+        game.restoreCheckpoint(checkpoint)
+        
+        self.game = game
+        self.generation += 1
+        self.settings = settings
+        self.checkpointer.meta = self.settings
+        # Alliances get new ids when they're restored, so the changes from here on can't be appended to the old checkpoint
+        self.checkpointer.writeFull(game.getCheckpoint())
+        return True
+    
+    #
+    # Playing
+    #
+    
+    def save(self):
+        """ Checkpoints the Game's progress. """
+        if not self.game.inProgress: return
+        if self.checkpointer.needsFull(self.game.rounds):
+            self.checkpointer.writeFull(self.game.getCheckpoint())
+        else:
+            self.checkpointer.writeDelta(self.game.getCheckpoint(changesOnly=True))
+    
+    def startGame(self, seed: Optional[int]=None) -> bool:
+        res = self.game.start(seed, record=True)
+        if res:
+            self.save()
+        return res
+    
+    async def start(self, seed: Optional[int]=None) -> bool:
+        return await self.run(self.startGame, seed)
+    
+    def step(self) -> tuple[Union[Result, bool, None], bool]:
+        """ Progresses the Game by one tribute's turn, then checkpoints it.
+            Gives the result of the turn, and whether the round is still going after it. """
+        res = self.game.next()
+        self.save()
+        return res, self.game.isRoundGoing()
+    
+    async def next(self) -> tuple[Union[Result, bool, None], bool]:
+        return await self.run(self.step)
+    
+    async def playRound(self, send: Callable[[Union[Result, bool, None], bool], Awaitable], ahead: int=4):
+        """ Plays turns until the round is over, passing each turn's result to `send` in order, as `next` gives them.
+            Upcoming turns are worked out in the background while earlier ones are being sent, up to `ahead` turns in advance.
+            Stops early if the Game isn't started or a new Game is loaded. If working out a turn fails, the turns before it are still sent before the error is raised. """
+        
+        queue: asyncio.Queue = asyncio.Queue(ahead)
+        generation = self.generation
+        
+        def stepSameGame() -> Optional[tuple[Union[Result, bool, None], bool]]:
+            # Checked under the lock, since a new Game could have been loaded while waiting for it
+            if self.generation != generation: return None
+            return self.step()
+        
+        async def produce():
+            try:
+                while True:
+                    turn = await self.run(stepSameGame)
+                    if turn == None: break
+                    await queue.put(turn)
+                    res, roundGoing = turn
+                    if res == False or not roundGoing: break
+            finally:
+                # Tells the sender there's nothing more. If the sender has already stopped, this is cancelled along with the producer
+                await queue.put(None)
+        
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                turn = await queue.get()
+                if turn == None or self.generation != generation: break
+                await send(*turn)
+        finally:
+            if not producer.done():
+                producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
+        # The turns worked out before the producer failed have been sent, so its error can be raised now
+        if not producer.cancelled() and producer.exception():
+            raise producer.exception()
+
+class SessionManager:
+    """ Keeps a Session for each key, such as a channel id, created the first time it's asked for.
+        Every Session's Game is loaded from the same content, which they share without changing.
+        Changes to the content itself, such as loading packs or adding to them, happen one at a time under the content lock. """
+    
+    def __init__(self, all: All, checkpointDir: str, defaultSettings: dict[str, object], workers: Optional[int]=None):
+        self.all = all
+        self.checkpointDir = checkpointDir
+        self.defaultSettings = defaultSettings
+        self.sessions: dict[Hashable, Session] = {}
+        
+        # Games are played in these threads instead of on the event loop
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="game")
+        self.contentLock = threading.Lock()
+    
+    def getCheckpointPath(self, key: Hashable) -> str:
+        return os.path.join(self.checkpointDir, f"{key}.ckpt")
+    
+    async def runInExecutor(self, fun: Callable, *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fun, *args)
+    
+    async def runLocked(self, fun: Callable, *args: Any) -> Any:
+        """ Runs a function in the executor for a caller holding a lock.
+            If the caller is cancelled, this still waits for the function to finish, since the thread can't be stopped and the lock has to stay held until it's done. """
+        future = asyncio.get_running_loop().run_in_executor(self.executor, fun, *args)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            await asyncio.wait([future])
+            raise
+    
+    async def runWithContent(self, fun: Callable, *args: Any) -> Any:
+        """ Runs a function which changes the shared content in the executor, while nothing else is loading from it. """
+        def locked():
+            with self.contentLock:
+                return fun(*args)
+        return await self.runInExecutor(locked)
+    
+    def get(self, key: Hashable) -> Session:
+        """ Gets the Session for the key, creating it if there isn't one. A new Session doesn't have a Game until one is loaded. """
+        session = self.sessions.get(key)
+        if session == None:
+            session = Session(key, self)
+            self.sessions[key] = session
+        return session
+    
+    def restoreAll(self) -> dict[Hashable, Exception]:
+        """ Continues every checkpointed Game. Checkpoint files are named by their key, which is read back as an int if it looks like one.
+            Returns the exceptions of the checkpoints which couldn't be restored, by key. """
+        
+        errors = {}
+        if not os.path.isdir(self.checkpointDir): return errors
+        for fName in sorted(os.listdir(self.checkpointDir)):
+            if not fName.endswith(".ckpt"): continue
+            key = fName[:-len(".ckpt")]
+            if key.isdigit(): key = int(key)
+            
+            session = Session(key, self)
+            try:
+                session.restore()
+            except Exception as e:
+                errors[key] = e
+                continue
+            self.sessions[key] = session
+        return errors
+    
+    def close(self):
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,200 @@
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from game.All import All
+from game.Game import Game
+from game.Rng import ReplayRandom
+from game.State import Result
+
+class SimulationSettings:
+    """ Everything a worker process needs to rebuild the content and game on its own. """
+    
+    def __init__(self, rootPath: str, characters: list[str], items: list[str], map: str, events: list[str], maxRounds: int=100, dirNames: dict[str, str]=None):
+        self.rootPath = rootPath
+        self.characters = characters
+        self.items = items
+        self.map = map
+        self.events = events
+        self.maxRounds = maxRounds
+        # Keyword arguments passed through to All, such as charsDirName
+        self.dirNames = dirNames if dirNames else {}
+
+class GameSummary:
+    """ The outcome of a single simulated game. """
+    
+    def __init__(self, seed: int):
+        self.seed = seed
+        self.rounds = 0
+        self.finished = False
+        self.error: Optional[str] = None
+        self.roundsSurvived: dict[str, int] = {}
+        self.winners: list[str] = []
+        self.triggers: dict[str, int] = {}
+
+class SimulationResults:
+    """ Aggregated outcomes of many simulated games. """
+    
+    def __init__(self):
+        self.games = 0
+        self.finished = 0
+        self.totalRounds = 0
+        self.roundsSurvived: dict[str, list[int]] = {}
+        self.wins: dict[str, int] = {}
+        self.triggers: dict[str, int] = {}
+        self.errors: dict[str, int] = {}
+    
+    def add(self, summary: GameSummary):
+        self.games += 1
+        self.totalRounds += summary.rounds
+        if summary.finished:
+            self.finished += 1
+        if summary.error:
+            self.errors[summary.error] = self.errors.get(summary.error, 0) + 1
+        for name, rounds in summary.roundsSurvived.items():
+            self.roundsSurvived.setdefault(name, []).append(rounds)
+        for name in summary.winners:
+            self.wins[name] = self.wins.get(name, 0) + 1
+        for name, count in summary.triggers.items():
+            self.triggers[name] = self.triggers.get(name, 0) + count
+    
+    def merge(self, other: SimulationResults):
+        self.games += other.games
+        self.finished += other.finished
+        self.totalRounds += other.totalRounds
+        for error, count in other.errors.items():
+            self.errors[error] = self.errors.get(error, 0) + count
+        for name, rounds in other.roundsSurvived.items():
+            self.roundsSurvived.setdefault(name, []).extend(rounds)
+        for name, count in other.wins.items():
+            self.wins[name] = self.wins.get(name, 0) + count
+        for name, count in other.triggers.items():
+            self.triggers[name] = self.triggers.get(name, 0) + count
+    
+    def getMeanGameLength(self) -> float:
+        if not self.games: return 0
+        return self.totalRounds / self.games
+    
+    def getMeanRoundsSurvived(self) -> dict[str, float]:
+        return {name: sum(rounds) / len(rounds) for name, rounds in self.roundsSurvived.items()}
+    
+    def getSortedTriggers(self) -> list[tuple[str, int]]:
+        return sorted(self.triggers.items(), key=lambda pair: pair[1], reverse=True)
+    
+    def string(self) -> str:
+        lines = [
+            f"Games: {self.games} ({self.finished} finished, {sum(self.errors.values())} errored)",
+            f"Mean game length: {self.getMeanGameLength():.2f} rounds",
+            "Mean rounds survived:"
+        ]
+        survived = self.getMeanRoundsSurvived()
+        for name in sorted(survived, key=survived.get, reverse=True):
+            lines.append(f"  {name}: {survived[name]:.2f} ({self.wins.get(name, 0)} wins)")
+        lines.append("Event triggers:")
+        for name, count in self.getSortedTriggers():
+            lines.append(f"  {name}: {count}")
+        if self.errors:
+            lines.append("Errors:")
+            for error, count in self.errors.items():
+                lines.append(f"  {error}: {count}")
+        return "\n".join(lines)
+
+def playGame(game: Game, seed: int, maxRounds: int) -> GameSummary:
+    """ Plays a loaded Game to completion without any output, using the given seed for the game's random stream. """
+    
+    summary = GameSummary(seed)
+    game.start(seed)
+    try:
+        # Finishes the last round rather than starting another one once it has been played
+        while not game.isOver() and (game.rounds < maxRounds or game.isRoundGoing()):
+            game.next()
+        summary.finished = game.isOver()
+    except Exception as e:
+        summary.error = str(e)
+    
+    summary.rounds = game.rounds
+    for name, tribute in game.tributes.items():
+        summary.roundsSurvived[name] = tribute.getRoundsSurvived()
+    summary.winners = [tribute.getName() for tribute in game.getAliveTributes()] if summary.finished else []
+    summary.triggers.update(game.getTriggerCounts())
+    return summary
+
+def replayGame(game: Game, log: bytes) -> list[Result]:
+    """ Plays a loaded Game again from the log of a recorded one, without any output, until the log runs out.
+        Raises a ReplayException if the game stops matching the log, such as when the content changed since it was recorded. """
+    
+    rng = ReplayRandom(log)
+    game.start(rng=rng)
+    results = []
+    while not rng.isFinished():
+        result = game.next()
+        if isinstance(result, Result):
+            results.append(result)
+    return results
+
+# The content loaded by this worker process, built once by _initWorker
+_workerAll: Optional[All] = None
+_workerSettings: Optional[SimulationSettings] = None
+
+def _initWorker(settings: SimulationSettings):
+    global _workerAll, _workerSettings
+    _workerAll = All(settings.rootPath, **settings.dirNames)
+    _workerSettings = settings
+
+def _playSeeds(seeds: list[int]) -> SimulationResults:
+    settings = _workerSettings
+    results = SimulationResults()
+    for seed in seeds:
+        game = _workerAll.loadGameWithSettings(settings.characters, settings.items, settings.map, settings.events)
+        results.add(playGame(game, seed, settings.maxRounds))
+    return results
+
+def simulate(settings: SimulationSettings, games: int, seed: int=0, workers: Optional[int]=None, chunkSize: int=25) -> SimulationResults:
+    """ Plays `games` complete games across a pool of worker processes and aggregates their results.
+        Game n is always played with the seed `seed + n`, so the results don't depend on the number of workers. """
+    
+    seeds = [seed + n for n in range(games)]
+    chunks = [seeds[n:n + chunkSize] for n in range(0, len(seeds), chunkSize)]
+    
+    results = SimulationResults()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_initWorker, initargs=(settings,)) as pool:
+        for chunkResults in pool.map(_playSeeds, chunks):
+            results.merge(chunkResults)
+    return results
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Plays many headless games and prints aggregated results.")
+    parser.add_argument("root", help="content root, such as ./yamlsources")
+    parser.add_argument("--chars-dir", default="characters")
+    parser.add_argument("--characters", default="", help="space-separated character packs")
+    parser.add_argument("--items", default="", help="space-separated item packs")
+    parser.add_argument("--map", default="simple")
+    parser.add_argument("--events", default="", help="space-separated event packs")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-rounds", type=int, default=100)
+    parser.add_argument("--replay", default=None, help="replays the choice log in this file instead of simulating")
+    args = parser.parse_args()
+    
+    settings = SimulationSettings(
+        args.root,
+        args.characters.split(" "),
+        args.items.split(" "),
+        args.map,
+        args.events.split(" "),
+        args.max_rounds,
+        {"charsDirName": args.chars_dir}
+    )
+    if args.replay:
+        with open(args.replay, "rb") as f:
+            log = f.read()
+        game = All(settings.rootPath, **settings.dirNames).loadGameWithSettings(settings.characters, settings.items, settings.map, settings.events)
+        for result in replayGame(game, log):
+            print("\n\n".join(result.getTexts()))
+            for char, effectTexts in result.getEffects().items():
+                print(f"  {char.getName()}: {', '.join(effectTexts)}")
+    else:
+        print(simulate(settings, args.games, args.seed, args.workers).string())
@@ -1,10 +1,13 @@
 
 from __future__ import annotations
-import re
-from typing import Optional, Union
+import random
+from typing import TYPE_CHECKING, Optional, Union
 
 from .Character import Character
 from .Item import Item
+if TYPE_CHECKING:
+    from .Runtime import Runtime
+    from .Text import Text
 
 class State:
     """ This is a more temporary counterpart to Valids.
@@ -12,10 +15,14 @@ class State:
         It also compiles each of the Results' strings with the Character the Result was performed on.
         """
     
-    def __init__(self, eventTriggers: dict[Character, int], baseChance: int=100, deep=0):
+    def __init__(self, eventTriggers: dict[Character, int], baseChance: int=100, deep=0, runtime: Runtime=None):
         self.eventTriggers = eventTriggers
         self.baseChance = baseChance
         self.deep = deep
+        # The Game's changing state, such as its Troves' contents
+        self.runtime = runtime
+        # The Game's random stream, used for every random decision made while the Event is prepared and triggered
+        self.rng = runtime.rng if runtime else random
         
         self.charsPool = {}
         self.itemsPool = {}
@@ -25,7 +32,7 @@ class State:
         self.resultStrs: dict[Character, list[str]] = {}
     
     def sub(self, eventTriggers, baseChance: int) -> State:
-        newState = State(eventTriggers, baseChance, self.deep + 1)
+        newState = State(eventTriggers, baseChance, self.deep + 1, self.runtime)
         newState.charsPool = self.charsPool
         newState.itemsPool = self.itemsPool
         return newState
@@ -34,6 +41,10 @@ class State:
         """ Gets the number of times the State's Event has triggered for a certain Character. """
         return self.eventTriggers.get(char, 0)
     
+    def incrementTriggers(self, char: Character):
+        """ Increments the number of times the State's Event has been triggered by a certain Character. """
+        self.eventTriggers[char] = self.eventTriggers.get(char, 0) + 1
+    
     def getTotalTriggers(self):
         """ Gets the total number of times the State's Event has triggered. """
         return sum(self.eventTriggers.values())
@@ -86,30 +97,9 @@ class Result:
             self.effects[affected] = []
         self.effects[affected].append(text)
     
-    def addText(self, text: str, state: State):
-        """ Replaces all shorthands in an Event's text result with their respective Character or Item.
-            Also handles pronouns, articles, and verb conjugation.
-            Adds the replaced text. """
-        textReplacePat = re.compile(r"([A-Za-z'\\]*)(@|&)(\w+)")
-        matches = textReplacePat.finditer(text)
-        offset = 0
-        for match in matches:
-            tag, objType, short = match.groups()
-            if tag.endswith("\\"):
-                replaceText = text[match.start(): match.end()].replace("\\", "")
-            else:
-                replaceObj = None
-                if objType == "@":
-                    replaceObj = state.getChar(short)
-                elif objType == "&":
-                    replaceObj = state.getItem(short)
-                replaceText = replaceObj.string(tag)
-            
-            text = text[:match.start() - offset] + replaceText + text[match.end() - offset:]
-            letterDiff = match.end() - match.start() - len(replaceText)
-            offset += letterDiff
-        
-        self.texts.append(text)
+    def addText(self, text: Text, state: State):
+        """ Renders an Event's parsed text with the State's Characters and Items and adds it. """
+        self.texts.append(text.render(state))
     
     def getMainChar(self):
         return self.mainChar
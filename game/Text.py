@@ -0,0 +1,57 @@
+from __future__ import annotations
+import re
+from typing import Union
+
+from game.State import State
+
+textReplacePat = re.compile(r"([A-Za-z'\\]*)(@|&)(\w+)")
+
+# A placeholder is (tag, object type, shorthand), such as ("They", "@", "main") for They@main
+Placeholder = tuple[str, str, str]
+
+class Text:
+    """ An Event's text, parsed once into literal runs and placeholders for Characters and Items.
+        Rendering only has to look up each placeholder's game object in the State and join the pieces. """
+    
+    def __init__(self, raw: str):
+        self.raw = raw
+        self.segments: list[Union[str, Placeholder]] = []
+        
+        literal = ""
+        end = 0
+        for match in textReplacePat.finditer(raw):
+            literal += raw[end:match.start()]
+            end = match.end()
+            tag, objType, short = match.groups()
+            if tag.endswith("\\"):
+                # Escaped placeholders are kept as they are, minus the backslash
+                literal += match.group().replace("\\", "")
+                continue
+            if literal:
+                self.segments.append(literal)
+                literal = ""
+            self.segments.append((tag, objType, short))
+        literal += raw[end:]
+        if literal:
+            self.segments.append(literal)
+    
+    def __repr__(self):
+        return f"Text \"{self.raw}\""
+    
+    def getPlaceholders(self) -> list[Placeholder]:
+        return [segment for segment in self.segments if type(segment) == tuple]
+    
+    def render(self, state: State) -> str:
+        """ Replaces all placeholders with their respective Character or Item from the State.
+            Also handles pronouns, articles, and verb conjugation. """
+        parts: list[str] = []
+        for segment in self.segments:
+            if type(segment) == str:
+                parts.append(segment)
+                continue
+            tag, objType, short = segment
+            if objType == "@":
+                parts.append(state.getChar(short).string(tag))
+            else:
+                parts.append(state.getItem(short).string(tag))
+        return "".join(parts)
@@ -0,0 +1,97 @@
+from __future__ import annotations
+from collections import deque
+from typing import Any, NamedTuple, Optional
+
+#
+#
+# Records
+#
+#
+
+class EventChoice(NamedTuple):
+    """ Recorded by Game.chooseFromEvents after matching a Character against the candidate Events. """
+    charName: str
+    alive: bool
+    age: int
+    location: Optional[str]
+    status: Optional[str]
+    tags: tuple[str, ...]
+    items: tuple[str, ...]
+    alliance: Optional[int]
+    possible: tuple[str, ...]
+    default: Optional[str]
+    
+    def string(self) -> str:
+        return "\n".join([
+            f"Character: {self.charName}",
+            f"  alive:\t{self.alive}",
+            f"  age:\t{self.age}",
+            f"  location:\t{self.location}",
+            f"  status:\t{self.status}",
+            f"  tags:\t{', '.join(self.tags)}",
+            f"  inventory:\t{', '.join(self.items)}",
+            f"  alliance:\t{self.alliance}",
+            f"Possible events: {', '.join(self.possible)}",
+            f"Default event: {self.default}"
+        ])
+
+class ArgsValidation(NamedTuple):
+    """ Recorded by Valids.validateArgs once an EventPart's arguments are validated. """
+    types: tuple[str, ...]
+    args: tuple[Any, ...]
+    
+    def string(self) -> str:
+        return f"Validated args {list(self.args)} as {list(self.types)}"
+
+class EventLoad(NamedTuple):
+    """ Recorded by Event.load. """
+    eventName: str
+    
+    def string(self) -> str:
+        return f"Loading event {self.eventName}"
+
+class EventParse(NamedTuple):
+    """ Recorded by All.eventFromYamlNew. """
+    eventName: str
+    
+    def string(self) -> str:
+        return f"Beginning load for event {self.eventName}"
+
+#
+#
+# Buffer
+#
+#
+
+class Trace:
+    """ A bounded, in-memory log of what the game did, for debugging. Off by default.
+        Callers check `enabled` before building a record, so nothing is formatted or stored while it's off.
+        Once full, the oldest record is dropped to make room for a new one. """
+    
+    def __init__(self, maxSize: int=2048):
+        self.enabled = False
+        self.records: deque[NamedTuple] = deque(maxlen=maxSize)
+    
+    def enable(self, maxSize: Optional[int]=None):
+        if maxSize != None and maxSize != self.records.maxlen:
+            self.records = deque(self.records, maxlen=maxSize)
+        self.enabled = True
+    
+    def disable(self):
+        self.enabled = False
+    
+    def clear(self):
+        self.records.clear()
+    
+    def record(self, record: NamedTuple):
+        self.records.append(record)
+    
+    def dump(self, last: Optional[int]=None) -> list[str]:
+        """ Gets the last buffered records as strings, oldest first. """
+        records = list(self.records)
+        if last != None:
+            records = records[-last:] if last > 0 else []
+        return [record.string() for record in records]
+
+# Shared by the whole process
+trace = Trace()
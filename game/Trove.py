@@ -1,11 +1,15 @@
 
-from random import choice
-from typing import Union
+import random
+from random import Random
+from typing import Optional
 
-from game.Item import Item
+from game.Item import Item, compileTags
 
 class Trove:
-    """ A collection of random Items that Events can give Characters. """
+    """ A collection of random Items that Events can give Characters.
+        Troves are shared by every Game using their Map, and never change while playing.
+        The Items a Trove can hold out of a set of loaded Items are found once, in a TroveTable,
+        and the Items a Game has generated are kept in its Runtime, as indices into that table. """
     
     def __init__(self, name: str, count: int, pool: list[list[str]], has: list[str]):
         self.name = name
@@ -15,46 +19,79 @@ class Trove:
         self.tagsPool = pool
         # Guaranteed items (specific items)
         self.has = has
-        # A list of Items which can be generated
-        self.pool: list[Item] = []
-        # A list of Items which have been generated
-        self.gen: list[Item] = []
     
     def getName(self):
         return self.name
+
+class TroveTable:
+    """ The Items a Trove can hold out of one set of loaded Items: its guaranteed Items, followed by the candidates it generates from.
+        Built once per set of loaded Items and shared by every Game loaded with them, so it's never changed after being built.
+        A Trove that can't be generated from the Items doesn't stop them from loading. Its error is only raised once a Game generates it. """
     
-    def reset(self):
-        """ Resets the Trove's generated items. """
-        self.pool = []
-        self.gen = []
-    
-    def load(self, loadedItems: dict[str, Item]):
-        """ Populates the Trove's generated items. """
+    def __init__(self, trove: Trove, loadedItems: dict[str, Item]):
+        self.trove = trove
+        # Why the Trove can't be generated from the loaded Items, if it can't
+        self.error: Optional[str] = None
         
-        for tagList in self.tagsPool:
+        candidates: list[Item] = []
+        for tagList in trove.tagsPool:
             if tagList[0].startswith("="):
                 targetName = tagList[0][1:]
                 item = loadedItems.get(targetName)
-                if not item: raise Exception(f"Encountered invalid specific item name in Trove \"{self.name}\"'s pool: \"{targetName}\"")
-                self.pool.append(item.copy())
+                if item:
+                    candidates.append(item)
+                elif not self.error:
+                    self.error = f"Encountered invalid specific item name in Trove \"{trove.name}\"'s pool: \"{targetName}\""
+            mask = compileTags(tagList)
             for item in loadedItems.values():
-                if item.hasAllTags(tagList):
-                    self.pool.append(item.copy())
+                if item.hasTagMask(mask):
+                    candidates.append(item)
         
-        for targetName in self.has:
+        guaranteed: list[Item] = []
+        for targetName in trove.has:
             item = loadedItems.get(targetName)
-            if not item: raise Exception(f"Encountered invalid specific item name in Trove \"{self.name}\"'s guaranteed items: \"{targetName}\"")
-            self.gen.append(item.copy())
+            if item:
+                guaranteed.append(item)
+            elif not self.error:
+                self.error = f"Encountered invalid specific item name in Trove \"{trove.name}\"'s guaranteed items: \"{targetName}\""
+        
+        if trove.count and not candidates and not self.error:
+            self.error = f"Trove \"{trove.name}\" has no items in its pool to generate from"
         
-        for _ in range(self.count):
-            self.gen.append(choice(self.pool))
+        self.guaranteedCt = len(guaranteed)
+        self.candidateCt = len(candidates)
+        self.table: list[Item] = guaranteed + candidates
+        # Item name -> its first index in the table, for restoring checkpoints
+        self.positions: dict[str, int] = {}
+        for pos, item in enumerate(self.table):
+            self.positions.setdefault(item.name, pos)
+    
+    def generate(self, rng: Random=None) -> list[int]:
+        """ Generates the Trove's Items for a Game, giving their indices into the table. """
+        if self.error: raise Exception(self.error)
+        rng = rng or random
+        gen = list(range(self.guaranteedCt))
+        for _ in range(self.trove.count):
+            gen.append(self.guaranteedCt + rng.randrange(self.candidateCt))
+        return gen
+    
+    def getCheckpoint(self, gen: list[int]) -> list[str]:
+        """ Gets the names of the generated Items which haven't been looted yet. """
+        return [self.table[pos].name for pos in gen]
     
-    def hasItems(self):
-        return len(self.gen) > 0
+    def restoreCheckpoint(self, itemNames: list[str]) -> list[int]:
+        """ Gets the generated Items named in a checkpoint back as indices into the table. """
+        if self.error: raise Exception(self.error)
+        gen = []
+        for name in itemNames:
+            if not name in self.positions: raise Exception(f"Trove \"{self.trove.name}\" can't hold the checkpointed item \"{name}\"")
+            gen.append(self.positions[name])
+        return gen
     
-    def loot(self):
-        """ Gets a random Item from this Trove's generated Items. """
+    def loot(self, gen: list[int], rng: Random=None) -> Item:
+        """ Takes a random Item out of a Game's generated Items. """
         
-        item = choice(self.gen)
-        self.gen.remove(item)
-        return item
+        # Swap the drawn Item to the end so it can be removed without shifting the rest
+        pos = (rng or random).randrange(len(gen))
+        gen[pos], gen[-1] = gen[-1], gen[pos]
+        return self.table[gen.pop()]
@@ -1,22 +1,20 @@
 
 from __future__ import annotations
 from abc import ABC
-from game.Trove import Trove
+from game.Trove import Trove, TroveTable
 
-import re
 from typing import Callable, Type, Union
 
-from game.Item import Item, Item
+from game.Item import Item, compileTags
 from game.Map import Map, Zone
+from game.Text import Text
+from game.Trace import ArgsValidation, trace
 
-class Valids:
-    """ Created per-Event to check to see if the Event will run in the Game. """
+class Catalogue:
+    """ What a Game has loaded to validate Events against: its Map and Items, and the tables of the Map's Troves for those Items.
+        Created once per combination of loaded Map and Items and shared by the Valids of every Event, and by every Game loaded with them. """
     
     def __init__(self, loadedMap: Map, loadedItems: dict[str, Item]):
-        self.charShorts: list[str] = []
-        self.itemShorts: list[str] = []
-        self.charTags: list[str] = []
-        
         self.map = loadedMap
         
         self.loadedItems = loadedItems
@@ -25,6 +23,34 @@ class Valids:
             for tag in item.tags:
                 self.loadedItemTags.add(tag)
         
+        # Tags -> Items with all of them, since many Events ask for the same tags
+        self.itemsWithTags: dict[tuple[str, ...], list[Item]] = {}
+        # Built up front, so that Games only ever read them
+        self.troveTables: dict[Trove, TroveTable] = {trove: TroveTable(trove, loadedItems) for trove in loadedMap.troves.values()}
+    
+    def getLoadedItemsWithTags(self, tags: list[str]) -> list[Item]:
+        key = tuple(tags)
+        possItems = self.itemsWithTags.get(key)
+        if possItems == None:
+            mask = compileTags(tags)
+            possItems = [item for item in self.loadedItems.values() if item.hasTagMask(mask)]
+            self.itemsWithTags[key] = possItems
+        return list(possItems)
+
+class Valids:
+    """ Created per-Event to check to see if the Event will run in the Game.
+        Keeps the shorthands and tags the Event has introduced so far, and looks up loaded content in the shared Catalogue. """
+    
+    def __init__(self, catalogue: Catalogue):
+        self.charShorts: list[str] = []
+        self.itemShorts: list[str] = []
+        self.charTags: list[str] = []
+        
+        self.catalogue = catalogue
+        self.map = catalogue.map
+        self.loadedItems = catalogue.loadedItems
+        self.loadedItemTags = catalogue.loadedItemTags
+        
         self.checks = {
             "char short": self.validateCharShort,
             "item short": self.validateItemShort,
@@ -119,11 +145,7 @@ class Valids:
     #
     
     def getLoadedItemsWithTags(self, tags: list[str]) -> list[Item]:
-        possItems = []
-        for item in self.loadedItems.values():
-            if item.hasAllTags(tags):
-                possItems.append(item)
-        return possItems
+        return self.catalogue.getLoadedItemsWithTags(tags)
     
     def getLoadedItemWithName(self, name: str) -> Item:
         # we've guaranteed the item name is valid when this is called
@@ -137,17 +159,12 @@ class Valids:
     
     def validateArgs(self, types: list[str], args: list[str]) -> None:
         i = 0
-        print("Validating")
-        print(f"  types: {types}")
-        print(f"  args:  {args}")
         while i < len(types):
             typ = types[i]
-            print(f"    typ: {typ}")
             
             if i >= len(args):
                 args.append(None)
             arg = args[i]
-            print(f"    arg: {arg}")
             
             if typ == "any": # Matches any
                 i += 1
@@ -160,12 +177,9 @@ class Valids:
                     continue
             
             if typ.endswith("name"): # hello future me when this doesn't work smile
-                print("    turning arg into name")
                 arg = " ".join(args[i:])
                 args[i] = arg
                 args = args[:i+1]
-                print("    " + arg)
-                print(f"    {args}")
             if typ.startswith("*"): # Check the rest of the arguments against the current type
                 typ = typ[1:]
                 while len(types) < len(args):
@@ -178,7 +192,8 @@ class Valids:
             if cast != None: args[i] = cast
             
             i += 1
-        print("Finished\n")
+        if trace.enabled:
+            trace.record(ArgsValidation(tuple(types), tuple(args)))
         return args
     
     #
@@ -187,12 +202,9 @@ class Valids:
     #
     #
     
-    def validateText(self, text) -> None:
-        textReplacePat = re.compile(r"([A-Za-z'\\]*)(@|&)(\w+)")
-        matches = textReplacePat.finditer(text)
-        for match in matches:
-            tag, objType, short = match.groups()
-            if tag.endswith("\\"): continue
+    def validateText(self, parsed: Text) -> None:
+        text = parsed.raw
+        for tag, objType, short in parsed.getPlaceholders():
             if objType == "&":
                 if tag != "" and not tag.lower() == "a":
                     raise ValidationException(f"in text:\n    \"{text}\"\n    Encountered non-article conjugation for {tag}&{short}")
@@ -53,7 +53,7 @@ def doCommand(op, *args):
             print("requires 1 arg")
             return False
         tribute = GAME.getTributeByName(args[0])
-        for tag in tribute.tags:
+        for tag in tribute.tags.values():
             print(tag)
     
     elif op == "give":
@@ -0,0 +1,142 @@
+import asyncio
+import unittest
+
+from Output import BLANK, MAXFIELDS, MAXFIELDVALUE, MAXTOTAL, FakeChannel, OutputScheduler, RateBucket, getEmbedLength, splitText, toFields
+
+def getResult(name: str, text: str="", effects: int=0) -> dict:
+    """ An embed shaped like MainCog's result embeds: the main Character's name, what happened to them, and a field per effect. """
+    return {
+        "title": name,
+        "description": text or f"{name} does something.",
+        "color": 0xbbff45,
+        "fields": [{"name": f"{name} {n}", "value": "gained something", "inline": True} for n in range(effects)]
+    }
+
+def sendOne(channel: FakeChannel):
+    """ Sends like MainCog does on discord.py 1.x, one embed per message. """
+    return lambda embeds: channel.send(embed=embeds[0])
+
+class TestFields(unittest.TestCase):
+    def test_splitText(self):
+        text = " ".join(["word"] * 1000)
+        pieces = splitText(text, MAXFIELDVALUE)
+        self.assertTrue(all(len(piece) <= MAXFIELDVALUE for piece in pieces))
+        self.assertEqual(" ".join(pieces), text)
+        self.assertEqual(splitText("", 10), [])
+    
+    def test_toFields(self):
+        fields = toFields(getResult("Arc", "x " * 1500, effects=2))
+        self.assertEqual(fields[0]["name"], "Arc")
+        # The description is split over the first fields, only the first of which is named
+        self.assertEqual([field["name"] for field in fields[1:-2]], [BLANK] * (len(fields) - 3))
+        self.assertEqual([field["name"] for field in fields[-2:]], ["Arc 0", "Arc 1"])
+        self.assertTrue(all(field["value"] and len(field["value"]) <= MAXFIELDVALUE for field in fields))
+        self.assertEqual(toFields({"title": "Round end!"})[0]["value"], BLANK)
+
+class TestOutputScheduler(unittest.IsolatedAsyncioTestCase):
+    async def test_combinesResults(self):
+        channel = FakeChannel()
+        output = OutputScheduler(sendOne(channel), combine=True)
+        for n in range(12):
+            await output.add(getResult(f"Tribute {n}", effects=1))
+        await output.close()
+        
+        self.assertEqual(len(channel.sends), 1)
+        fields = channel.getEmbeds()[0]["fields"]
+        self.assertEqual(len(fields), 24)
+        self.assertEqual([field["name"] for field in fields[::2]], [f"Tribute {n}" for n in range(12)])
+    
+    async def test_flushesAtFieldLimit(self):
+        channel = FakeChannel()
+        output = OutputScheduler(sendOne(channel), combine=True)
+        for n in range(30):
+            await output.add(getResult(f"Tribute {n}"))
+        # The first message is sent as soon as it's full, without waiting for the timer
+        self.assertEqual(len(channel.sends), 1)
+        await output.close()
+        
+        self.assertEqual([len(embed["fields"]) for embed in channel.getEmbeds()], [MAXFIELDS, 30 - MAXFIELDS])
+    
+    async def test_flushesAtLengthLimit(self):
+        channel = FakeChannel()
+        output = OutputScheduler(sendOne(channel), combine=True)
+        for n in range(12):
+            await output.add(getResult(f"Tribute {n}", "x" * 1000))
+        await output.close()
+        
+        embeds = channel.getEmbeds()
+        self.assertEqual(sum(len(embed["fields"]) for embed in embeds), 12)
+        self.assertTrue(all(getEmbedLength(embed) <= MAXTOTAL for embed in embeds))
+        self.assertEqual(len(embeds), 3)
+    
+    async def test_packsEmbedsWithoutCombining(self):
+        channel = FakeChannel()
+        output = OutputScheduler(lambda embeds: channel.send(embeds=embeds))
+        for n in range(25):
+            await output.add(getResult(f"Tribute {n}"))
+        await output.close()
+        
+        self.assertEqual([len(embeds) for _, _, embeds in channel.sends], [10, 10, 5])
+    
+    async def test_flushesAfterDelay(self):
+        channel = FakeChannel()
+        output = OutputScheduler(sendOne(channel), maxDelay=0.05, combine=True)
+        await output.add(getResult("Arc"))
+        self.assertEqual(len(channel.sends), 0)
+        await asyncio.sleep(0.1)
+        self.assertEqual(len(channel.sends), 1)
+        await output.close()
+        self.assertEqual(len(channel.sends), 1)
+    
+    async def test_retriesAfterRateLimit(self):
+        channel = FakeChannel(retryAfter=0.1)
+        output = OutputScheduler(sendOne(channel), bucket=RateBucket(5, 1.0), combine=True)
+        channel.failNext()
+        start = asyncio.get_running_loop().time()
+        await output.add(getResult("Arc"))
+        await output.close()
+        
+        self.assertEqual(channel.rejected, 1)
+        self.assertEqual(len(channel.sends), 1)
+        # The retry waits for as long as the 429 said to
+        self.assertGreaterEqual(channel.sends[0][0] - start, 0.1)
+    
+    async def test_givesUpAfterRetries(self):
+        channel = FakeChannel(retryAfter=0.01)
+        output = OutputScheduler(sendOne(channel), maxRetries=2, combine=True)
+        channel.failNext(3)
+        await output.add(getResult("Arc"))
+        with self.assertRaises(Exception) as caught:
+            await output.close()
+        self.assertEqual(caught.exception.status, 429)
+        self.assertEqual(channel.rejected, 3)
+    
+    async def test_waitsForBucket(self):
+        # The local bucket matches the channel's limit, so nothing is sent early enough to be answered with a 429
+        channel = FakeChannel(limit=2, per=0.2)
+        output = OutputScheduler(sendOne(channel), bucket=RateBucket(2, 0.2))
+        for n in range(5):
+            await output.add(getResult(f"Tribute {n}"))
+            await output.flush()
+        await output.close()
+        
+        self.assertEqual(channel.rejected, 0)
+        times = [time for time, _, _ in channel.sends]
+        self.assertEqual(len(times), 5)
+        self.assertGreaterEqual(times[2] - times[0], 0.2)
+        self.assertGreaterEqual(times[4] - times[2], 0.2)
+    
+    async def test_recoversFromStricterChannel(self):
+        # The channel allows fewer sends than the bucket expects, so its 429s have to be waited out
+        channel = FakeChannel(limit=1, per=0.1)
+        output = OutputScheduler(sendOne(channel), bucket=RateBucket(5, 0.1))
+        for n in range(3):
+            await output.add(getResult(f"Tribute {n}"))
+            await output.flush()
+        await output.close()
+        
+        self.assertGreater(channel.rejected, 0)
+        self.assertEqual([embed["title"] for embed in channel.getEmbeds()], ["Tribute 0", "Tribute 1", "Tribute 2"])
+
+if __name__ == "__main__":
+    unittest.main()